@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 """ Filter pointcloud """
+from functools import lru_cache
+
 import numpy as np
 
+from lidro.create_mask_hydro.pointcloud.point_columns import PointColumns
+
 
 def filter_pointcloud(input_points: np.array, classes: list):
     """Filter pointcloud by class
@@ -18,3 +22,38 @@ def filter_pointcloud(input_points: np.array, classes: list):
     filtered_points = input_points[points_mask, :]
 
     return filtered_points  # returns coordinates points filtering
+
+
+@lru_cache(maxsize=None)
+def _class_lookup_table(classes: tuple) -> np.ndarray:
+    lookup_table = np.zeros(256, dtype=bool)
+    lookup_table[list(classes)] = True
+    lookup_table.flags.writeable = False  # the table is shared by all the calls with the same classes
+    return lookup_table
+
+
+def get_class_lookup_table(classes: list) -> np.ndarray:
+    """Get a 256-entry boolean lookup table, True for the classification codes in classes.
+    The table is built only once for a given list of classes.
+
+    Args:
+        classes (list): List of classes (integers in [0, 255])
+
+    Returns:
+        np.ndarray: boolean array of size 256
+    """
+    return _class_lookup_table(tuple(sorted({int(classe) for classe in classes})))
+
+
+def filter_point_columns(points: PointColumns, classes: list) -> PointColumns:
+    """Filter pointcloud stored as columns by class.
+    The uint8 classification is turned into a mask with a single gather in a lookup table (no sorting as with np.isin)
+
+    Args:
+        points (PointColumns): point coordinates and classification
+        classes (list): List of classes to use for the filtering
+
+    Returns:
+        PointColumns: points after filtering
+    """
+    return points.filter(get_class_lookup_table(classes)[points.classification])
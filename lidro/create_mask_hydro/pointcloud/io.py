@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 """ extract coordinates the original tiles without buffer """
+import logging
+
+import laspy
 import numpy as np
 
 
@@ -18,3 +21,31 @@ def get_pointcloud_origin(points: np.array, tile_size: int = 1000, buffer_size:
         return origin_x, origin_y
     else:
         raise ValueError(f"Extents (diff_x={diff_x} and diff_y={diff_y}) is bigger than tile_size ({tile_size}).")
+
+
+def get_pointcloud_origin_from_header(las_file: str, tile_size: int = 1000, buffer_size: float = 0):
+    """Extract the origin of the tile from the bounds stored in the LAS header, without reading the points
+
+    Args:
+        las_file (str): Path to the LAS file
+        tile_size (int): size of the tile (in meters)
+        buffer_size (float): size of the buffer around the tile (in meters)
+
+    Returns:
+        Tuple[float, float] | None: coordinates of the top left corner of the tile, or None if the header bounds
+        look inconsistent (no points, invalid bounds or extent bigger than tile_size). In that case, the origin
+        should be computed from the points with get_pointcloud_origin
+    """
+    with laspy.open(las_file) as f:
+        header = f.header
+
+    mins, maxs = np.asarray(header.mins[:2]), np.asarray(header.maxs[:2])
+    if header.point_count == 0 or not np.all(np.isfinite([mins, maxs])) or np.any(mins > maxs):
+        logging.warning(f"Inconsistent bounds in the header of {las_file}: the points will be scanned")
+        return None
+
+    try:
+        return get_pointcloud_origin(np.vstack((mins, maxs)), tile_size, buffer_size)
+    except ValueError:
+        logging.warning(f"Header extent of {las_file} is bigger than tile_size: the points will be scanned")
+        return None
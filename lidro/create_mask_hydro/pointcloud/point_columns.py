@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+""" Column-wise representation of a pointcloud (one array by dimension, each with its own dtype) """
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy as np
+
+
+@dataclass
+class PointColumns:
+    """Points of a pointcloud stored as one array by dimension:
+    X/Y as float64, Z as float32 and classification as uint8.
+    Compared to a (N, 4) float64 array, it avoids the float64 copy of the classification and the vstack copy.
+    """
+
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+    classification: np.ndarray
+
+    def __post_init__(self):
+        self.x = np.asarray(self.x, dtype=np.float64)
+        self.y = np.asarray(self.y, dtype=np.float64)
+        self.z = np.asarray(self.z, dtype=np.float32)
+        self.classification = np.asarray(self.classification, dtype=np.uint8)
+
+    @classmethod
+    def from_las(cls, las) -> "PointColumns":
+        """Create the columns from a laspy LasData or point record (for example a chunk from chunk_iterator)"""
+        return cls(las.x, las.y, las.z, las.classification)
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def filter(self, mask: np.ndarray) -> "PointColumns":
+        """Return the points selected by a boolean mask (or an array of indices)"""
+        return PointColumns(self.x[mask], self.y[mask], self.z[mask], self.classification[mask])
+
+    def bounds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the (xmin, ymin) and (xmax, ymax) of the points"""
+        return np.array([self.x.min(), self.y.min()]), np.array([self.x.max(), self.y.max()])
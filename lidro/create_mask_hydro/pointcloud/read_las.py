@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
 """ read pointcloud and extracts points (X, Y, Z, classification) and crs"""
+from typing import Iterator
+
 import laspy
 import numpy as np
 
+from lidro.create_mask_hydro.pointcloud.point_columns import PointColumns
+
+# number of points read at once when a whole pointcloud is read in columns
+READ_CHUNK_SIZE = 1_000_000
+
 
 def read_pointcloud(las_file: str):
     """Reads a LAS pointcloud file and extracts point coordinates (X, Y, Z, classification)
@@ -23,3 +30,53 @@ def read_pointcloud(las_file: str):
     crs = las.header.parse_crs()
 
     return output_points, crs
+
+
+def read_pointcloud_columns(las_file: str, chunk_size: int = READ_CHUNK_SIZE):
+    """Reads a LAS pointcloud file and extracts points as columns (X, Y, Z, classification),
+    with a suitable dtype for each dimension. The file is read by chunks of chunk_size points, copied
+    in the columns: the other dimensions of the points are never held for the whole file
+
+    Args:
+        las_file (str): Path to the LAS file
+        chunk_size (int): Maximum number of points read at once
+
+    Returns:
+        points (PointColumns) : point coordinates and classification
+        crs (dict): a pyproj CRS object
+    """
+    with laspy.open(las_file) as f:
+        nb_points = f.header.point_count
+        points = PointColumns(
+            np.empty(nb_points, dtype=np.float64),
+            np.empty(nb_points, dtype=np.float64),
+            np.empty(nb_points, dtype=np.float32),
+            np.empty(nb_points, dtype=np.uint8),
+        )
+        start = 0
+        for chunk in f.chunk_iterator(chunk_size):
+            end = start + len(chunk)
+            points.x[start:end] = chunk.x
+            points.y[start:end] = chunk.y
+            points.z[start:end] = chunk.z
+            points.classification[start:end] = chunk.classification
+            start = end
+        crs = f.header.parse_crs()
+
+    return points, crs
+
+
+def read_pointcloud_by_chunks(las_file: str, chunk_size: int) -> Iterator[PointColumns]:
+    """Reads a LAS pointcloud file by chunks of chunk_size points, so that the memory used
+    depends on the chunk size rather than on the number of points of the file
+
+    Args:
+        las_file (str): Path to the LAS file
+        chunk_size (int): Maximum number of points read at once
+
+    Yields:
+        PointColumns : point coordinates and classification of a chunk (X, Y, Z, classification)
+    """
+    with laspy.open(las_file) as f:
+        for chunk in f.chunk_iterator(chunk_size):
+            yield PointColumns.from_las(chunk)
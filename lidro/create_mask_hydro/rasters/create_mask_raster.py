@@ -6,9 +6,61 @@ from typing import List, Tuple
 import numpy as np
 import scipy.ndimage
 
-from lidro.create_mask_hydro.pointcloud.filter_las import filter_pointcloud
-from lidro.create_mask_hydro.pointcloud.io import get_pointcloud_origin
-from lidro.create_mask_hydro.pointcloud.read_las import read_pointcloud
+from lidro.create_mask_hydro.pointcloud.filter_las import filter_point_columns
+from lidro.create_mask_hydro.pointcloud.io import (
+    get_pointcloud_origin,
+    get_pointcloud_origin_from_header,
+)
+from lidro.create_mask_hydro.pointcloud.read_las import (
+    read_pointcloud_by_chunks,
+    read_pointcloud_columns,
+)
+
+
+def init_occupancy_map(tile_size: int, pixel_size: float) -> np.array:
+    """Create an empty occupancy map for a tile
+
+    Args:
+        tile_size (int): size of the raster grid (in meters)
+        pixel_size (float): distance between each node of the raster grid (in meters)
+
+    Returns:
+        np.array: 2D boolean array (y, x) filled with False
+    """
+    nb_pixels = int(np.ceil(tile_size / pixel_size))
+    return np.zeros((nb_pixels, nb_pixels), dtype=bool)
+
+
+def update_occupancy_map(
+    occupancy: np.array, x: np.array, y: np.array, pixel_size: float, origin: Tuple[int, int]
+) -> np.array:
+    """Mark (in place) the pixels of an occupancy map that contain at least one of the input points.
+    Pixel indices are computed directly from the origin and the pixel size, so that points can be added
+    chunk after chunk. Points outside of the occupancy map are ignored.
+
+    Args:
+        occupancy (np.array): 2D boolean array (y, x), upper row first (cf. init_occupancy_map)
+        x (np.array): x coordinates of the points
+        y (np.array): y coordinates of the points
+        pixel_size (float): distance between each node of the raster grid (in meters)
+        origin (Tuple[int, int]): Coordinates of the top left corner of the top-left pixel
+
+    Returns:
+        np.array: the updated occupancy map
+    """
+    nb_rows, nb_cols = occupancy.shape
+    # Pixel indices from the left and from the bottom of the grid: as with np.histogram2d, a point on the edge
+    # between 2 pixels belongs to the right/upper one, except on the right/top edges of the grid
+    col = np.floor((x - origin[0]) / pixel_size)
+    row_from_bottom = np.floor((y - (origin[1] - nb_rows * pixel_size)) / pixel_size)
+    col[(col == nb_cols) & (x == origin[0] + nb_cols * pixel_size)] = nb_cols - 1
+    row_from_bottom[(row_from_bottom == nb_rows) & (y == origin[1])] = nb_rows - 1
+
+    in_grid = (col >= 0) & (col < nb_cols) & (row_from_bottom >= 0) & (row_from_bottom < nb_rows)
+    row = nb_rows - 1 - row_from_bottom[in_grid].astype(np.intp)  # upper row first
+    occupancy[row, col[in_grid].astype(np.intp)] = True
+
+    return occupancy
 
 
 def create_occupancy_map(points: np.array, tile_size: int, pixel_size: float, origin: Tuple[int, int]):
@@ -24,16 +76,75 @@ def create_occupancy_map(points: np.array, tile_size: int, pixel_size: float, or
         bins (np.array): 2D binary array (x, y) with 1 for if there is at least one point of the input cloud
         in the corresponding pixel, 0 otherwise
     """
-    # Compute number of points per bin
-    bins_x = np.arange(origin[0], origin[0] + tile_size + pixel_size, pixel_size)
-    bins_y = np.arange(origin[1] - tile_size, origin[1] + pixel_size, pixel_size)
-    _bins, _, _ = np.histogram2d(points[:, 1], points[:, 0], bins=[bins_y, bins_x])
-    bins = np.flipud(_bins)
-    bins = bins > 0  # binarize map
-    return bins
+    occupancy = init_occupancy_map(tile_size, pixel_size)
+    return update_occupancy_map(occupancy, points[:, 0], points[:, 1], pixel_size, origin)
+
 
+def get_pointcloud_origin_by_chunks(filename: str, tile_size: int, chunk_size: int) -> Tuple[int, int]:
+    """Get the origin of the tile from the bounding box of the points, read by chunks of chunk_size points
 
-def detect_hydro_by_tile(filename: str, tile_size: int, pixel_size: float, classes: List[int], dilation_size: int):
+    Args:
+        filename (str): input pointcloud
+        tile_size (int): size of the raster grid (in meters)
+        chunk_size (int): maximum number of points read at once
+
+    Returns:
+        pcd_origin (list): top left corner of the tile containing the point cloud
+    """
+    mins, maxs = np.full(2, np.inf), np.full(2, -np.inf)
+    for chunk in read_pointcloud_by_chunks(filename, chunk_size):
+        chunk_mins, chunk_maxs = chunk.bounds()
+        mins, maxs = np.minimum(mins, chunk_mins), np.maximum(maxs, chunk_maxs)
+    return get_pointcloud_origin(np.vstack((mins, maxs)), tile_size)
+
+
+def create_occupancy_map_by_chunks(
+    filename: str,
+    tile_size: int,
+    pixel_size: float,
+    classes: List[int],
+    chunk_size: int,
+    pcd_origin: Tuple[int, int] = None,
+) -> Tuple[np.array, Tuple[int, int]]:
+    """Create the occupancy map of a pointcloud read by chunks of chunk_size points,
+    so that the memory used does not depend on the number of points of the tile
+
+    Args:
+        filename (str): input pointcloud
+        tile_size (int): size of the raster grid (in meters)
+        pixel_size (float): distance between each node of the raster grid (in meters)
+        classes (List[int]): List of classes to use for the binarisation
+        chunk_size (int): maximum number of points read at once
+        pcd_origin (Tuple[int, int]): top left corner of the tile. If None, it is infered from the bounding box
+        of the points (which requires an extra pass over the file)
+
+    Returns:
+        occupancy (np.array): 2D binary array (x, y) with 1 for if there is at least one point of the selected classes
+        in the corresponding pixel, 0 otherwise
+        pcd_origin (list): top left corner of the tile containing the point cloud
+    """
+    if pcd_origin is None:
+        # First pass: bounding box of the pointcloud, to get the tile origin
+        pcd_origin = get_pointcloud_origin_by_chunks(filename, tile_size, chunk_size)
+
+    # Mark the pixels occupied by the points of each chunk
+    occupancy = init_occupancy_map(tile_size, pixel_size)
+    for chunk in read_pointcloud_by_chunks(filename, chunk_size):
+        chunk_filter = filter_point_columns(chunk, classes)
+        update_occupancy_map(occupancy, chunk_filter.x, chunk_filter.y, pixel_size, pcd_origin)
+
+    return occupancy, pcd_origin
+
+
+def detect_hydro_by_tile(
+    filename: str,
+    tile_size: int,
+    pixel_size: float,
+    classes: List[int],
+    dilation_size: int,
+    chunk_size: int = None,
+    origin_from_header: bool = False,
+):
     """ "Detect hydrographic surfaces in a tile from the classified points of the input pointcloud
         An hydrographic surface is defined as a surface where there is no points from any class different from water
     The output hydrographic surface mask is dilated to make sure that the masks are continuous when merged with their
@@ -45,23 +156,39 @@ def detect_hydro_by_tile(filename: str, tile_size: int, pixel_size: float, class
             classes (List[int]): List of classes to use for the binarisation (points with other
                         classification values are ignored)
             dilation_size (int): size of the structuring element for dilation
+            chunk_size (int): if not None, the pointcloud is read by chunks of chunk_size points to bound
+                        the memory used by a tile
+            origin_from_header (bool): if True, the tile origin is infered from the bounds of the LAS header
+                        (the points are scanned only if these bounds are inconsistent)
 
         Returns:
             smoothed_water (np.array):  2D binary array (x, y) of the water presence from the point cloud
             pcd_origin (list): top left corner of the tile containing the point cloud
             (infered from pointcloud bounding box and input tile size)
     """
-    # Read pointcloud, and extract coordinates (X, Y, Z, and classification) of all points
-    array, crs = read_pointcloud(filename)
+    # Extracts parameters for binarisation from the header if possible
+    pcd_origin = get_pointcloud_origin_from_header(filename, tile_size) if origin_from_header else None
+
+    if chunk_size:
+        # Read pointcloud by chunks, and create occupancy map (2D) from the points of the selected classes
+        occupancy, pcd_origin = create_occupancy_map_by_chunks(
+            filename, tile_size, pixel_size, classes, chunk_size, pcd_origin
+        )
+    else:
+        # Read pointcloud, and extract coordinates (X, Y, Z, and classification) of all points
+        points, crs = read_pointcloud_columns(filename)
 
-    # Extracts parameters for binarisation
-    pcd_origin = get_pointcloud_origin(array, tile_size)
+        # Extracts parameters for binarisation from the points
+        if pcd_origin is None:
+            pcd_origin = get_pointcloud_origin(np.vstack(points.bounds()), tile_size)
 
-    # Filter pointcloud by classes: keep only points from selected classes that are not water
-    array_filter = filter_pointcloud(array, classes)
+        # Filter pointcloud by classes: keep only points from selected classes that are not water
+        points_filter = filter_point_columns(points, classes)
+        del points
 
-    # create occupancy map (2D)
-    occupancy = create_occupancy_map(array_filter, tile_size, pixel_size, pcd_origin)
+        # create occupancy map (2D)
+        occupancy = init_occupancy_map(tile_size, pixel_size)
+        update_occupancy_map(occupancy, points_filter.x, points_filter.y, pixel_size, pcd_origin)
 
     # Revert occupancy map to keep pixels where there is no point of the selected classes
     detected_water = np.logical_not(occupancy)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+""" Gather the water masks of several tiles in a single raster mosaic (memory-mapped file)
+"""
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from lidro.create_mask_hydro.pointcloud.io import get_pointcloud_origin_from_header
+from lidro.create_mask_hydro.pointcloud.read_las import READ_CHUNK_SIZE
+from lidro.create_mask_hydro.rasters.create_mask_raster import (
+    detect_hydro_by_tile,
+    get_pointcloud_origin_by_chunks,
+)
+from lidro.create_mask_hydro.tile_executor import run_on_tiles
+
+
+def get_tile_origin(
+    filename: str, input_dir: str, tile_size: int, chunk_size: int = None, origin_from_header: bool = False
+) -> Tuple[float, float]:
+    """Get the origin (top left corner) of a tile, as detect_hydro_by_tile does: from the LAS header if
+    origin_from_header is True and its bounds are consistent, otherwise from the bounding box of the points.
+    Only the bounding box is needed: the points are always read by chunks
+
+    Args:
+        filename (str): filename of the LAS file
+        input_dir (str): folder which contains the LAS file
+        tile_size (int): size of the tiles (in meters)
+        chunk_size (int): if not None, the pointcloud is read by chunks of chunk_size points
+        (by chunks of READ_CHUNK_SIZE points otherwise)
+        origin_from_header (bool): if True, the tile origin is infered from the LAS header bounds
+
+    Returns:
+        Tuple[float, float]: origin of the tile
+    """
+    input_file = os.path.join(input_dir, filename)
+    origin = get_pointcloud_origin_from_header(input_file, tile_size) if origin_from_header else None
+    if origin is None:
+        origin = get_pointcloud_origin_by_chunks(input_file, tile_size, chunk_size or READ_CHUNK_SIZE)
+    return origin
+
+
+def get_tiles_origins(
+    input_dir: str,
+    filenames: List[str],
+    tile_size: int,
+    chunk_size: int = None,
+    origin_from_header: bool = False,
+    num_workers: int = 1,
+) -> Dict[str, Tuple[float, float]]:
+    """Get the origin (top left corner) of each tile (see get_tile_origin), using num_workers processes
+
+    Args:
+        input_dir (str): folder which contains the LAS files
+        filenames (List[str]): filenames of the LAS files
+        tile_size (int): size of the tiles (in meters)
+        chunk_size (int): if not None, the pointclouds are read by chunks of chunk_size points
+        origin_from_header (bool): if True, the tiles origins are infered from the LAS header bounds
+        num_workers (int): number of processes
+
+    Returns:
+        Dict[str, Tuple[float, float]]: origin of each tile
+    """
+    args = (input_dir, tile_size, chunk_size, origin_from_header)
+    return run_on_tiles(get_tile_origin, filenames, args, num_workers)
+
+
+def get_mosaic_extent(
+    origins: List[Tuple[float, float]], tile_size: int, pixel_size: float
+) -> Tuple[Tuple[float, float], Tuple[int, int]]:
+    """Get the origin and the shape of the mosaic that contains all the tiles
+
+    Args:
+        origins (List[Tuple[float, float]]): origin (top left corner) of each tile
+        tile_size (int): size of the tiles (in meters)
+        pixel_size (float): distance between each node of the raster grid (in meters)
+
+    Returns:
+        Tuple[float, float]: origin (top left corner) of the mosaic
+        Tuple[int, int]: shape (rows, columns) of the mosaic
+    """
+    origins = np.asarray(origins, dtype=np.float64)
+    mosaic_origin = (origins[:, 0].min(), origins[:, 1].max())
+    nb_pixels_tile = int(np.ceil(tile_size / pixel_size))
+    nb_rows = int(round((mosaic_origin[1] - origins[:, 1].min()) / pixel_size)) + nb_pixels_tile
+    nb_cols = int(round((origins[:, 0].max() - mosaic_origin[0]) / pixel_size)) + nb_pixels_tile
+    return mosaic_origin, (nb_rows, nb_cols)
+
+
+def add_tile_to_mosaic(
+    filename: str,
+    input_dir: str,
+    mosaic_path: str,
+    mosaic_origin: Tuple[float, float],
+    mosaic_shape: Tuple[int, int],
+    pixel_size: float,
+    tile_size: int,
+    classes: List[int],
+    dilation_size: int,
+    chunk_size: int = None,
+    origin_from_header: bool = False,
+):
+    """Detect the water surfaces of a tile and write them in its window of the (memory-mapped) mosaic.
+    Each tile has its own window, so that several processes can write in the same mosaic.
+
+    Args:
+        filename (str): filename of the LAS file
+        input_dir (str): folder which contains the LAS file
+        mosaic_path (str): path to the memory-mapped mosaic (uint8)
+        mosaic_origin (Tuple[float, float]): top left corner of the mosaic
+        mosaic_shape (Tuple[int, int]): shape (rows, columns) of the mosaic
+        pixel_size (float): distance between each node of the raster grid (in meters)
+        tile_size (int): size of the tiles (in meters)
+        classes (List[int]): List of classes to consider as "non-water"
+        dilation_size (int): size for dilatation raster
+        chunk_size (int): if not None, the pointcloud is read by chunks of chunk_size points
+        origin_from_header (bool): if True, the tile origin is infered from the LAS header bounds
+
+    Raises:
+        ValueError: when the tile is outside of the mosaic
+    """
+    input_file = os.path.join(input_dir, filename)
+    water_mask, pcd_origin = detect_hydro_by_tile(
+        input_file, tile_size, pixel_size, classes, dilation_size, chunk_size, origin_from_header
+    )
+    row = int(round((mosaic_origin[1] - pcd_origin[1]) / pixel_size))
+    col = int(round((pcd_origin[0] - mosaic_origin[0]) / pixel_size))
+    nb_rows, nb_cols = water_mask.shape
+    if row < 0 or col < 0 or row + nb_rows > mosaic_shape[0] or col + nb_cols > mosaic_shape[1]:
+        raise ValueError(f"Tile {filename} (origin: {pcd_origin}) is outside of the mosaic")
+
+    mosaic = np.memmap(mosaic_path, dtype=np.uint8, mode="r+", shape=tuple(mosaic_shape))
+    window = mosaic[row : row + nb_rows, col : col + nb_cols]  # noqa: E203
+    np.maximum(window, water_mask, out=window)
+    mosaic.flush()
+    del mosaic
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+""" Run a function on several LIDAR tiles, either sequentially or with a pool of processes
+"""
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+
+@dataclass
+class TileReport:
+    """Result of the processing of a single tile"""
+
+    filename: str
+    duration: float
+    error: str = None
+    result: Any = field(default=None, repr=False)
+
+
+def _run_one_tile(func: Callable, filename: str, *args) -> TileReport:
+    """Run func on one tile, and catch its errors so that they are reported at the end of the run
+
+    Args:
+        func (Callable): function to run, called as func(filename, *args)
+        filename (str): filename of the tile
+
+    Returns:
+        TileReport: timing and error (if any) for this tile
+    """
+    start = time.perf_counter()
+    try:
+        result = func(filename, *args)
+    except Exception as error:
+        logging.exception(f"Error while processing tile {filename}")
+        return TileReport(filename, time.perf_counter() - start, error=f"{type(error).__name__}: {error}")
+    return TileReport(filename, time.perf_counter() - start, result=result)
+
+
+def log_summary(reports: List[TileReport], total_duration: float):
+    """Log the timings of each tile and the list of failures
+
+    Args:
+        reports (List[TileReport]): reports of the processed tiles
+        total_duration (float): wall time of the whole run (in seconds)
+    """
+    failures = [report for report in reports if report.error]
+    lines = [f"{report.filename}: {report.duration:.2f} s" for report in sorted(reports, key=lambda r: r.filename)]
+    logging.info("Duration by tile:\n" + "\n".join(lines))
+    logging.info(
+        f"{len(reports) - len(failures)} tile(s) processed successfully, {len(failures)} failure(s) "
+        f"in {total_duration:.2f} s"
+    )
+    for report in failures:
+        logging.error(f"Tile {report.filename} failed: {report.error}")
+
+
+def run_on_tiles(func: Callable, filenames: List[str], args: tuple = (), num_workers: int = 1) -> Dict[str, Any]:
+    """Run func(filename, *args) on each tile, using num_workers processes (sequentially if num_workers <= 1).
+
+    A summary of the timings and failures is logged at the end of the run. On KeyboardInterrupt,
+    pending tiles are cancelled, the summary of the finished tiles is logged and the interruption is raised again.
+    If a worker process dies, the tiles that were not finished are reported as failures.
+
+    Args:
+        func (Callable): function to run on each tile. It must be picklable (defined at module level)
+                         when num_workers > 1
+        filenames (List[str]): filenames of the tiles
+        args (tuple): other arguments passed to func
+        num_workers (int): number of processes to use
+
+    Raises:
+        RuntimeError: when the processing of at least one tile has failed
+
+    Returns:
+        Dict[str, Any]: the result of func for each tile
+    """
+    reports = []
+    start = time.perf_counter()
+    try:
+        if num_workers is None or num_workers <= 1:
+            for filename in filenames:
+                reports.append(_run_one_tile(func, filename, *args))
+        else:
+            executor = ProcessPoolExecutor(max_workers=num_workers)
+            try:
+                futures = {executor.submit(_run_one_tile, func, filename, *args): filename for filename in filenames}
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            reports.append(future.result())
+                        except BrokenProcessPool as error:
+                            # a worker died (e.g. killed when out of memory): all the tiles that were not
+                            # finished fail with the pool, they are reported as the other failures
+                            duration = time.perf_counter() - start
+                            error_message = f"{type(error).__name__}: {error}"
+                            reports.append(TileReport(futures[future], duration, error=error_message))
+            finally:
+                # on interruption, do not wait for the tiles that are not started yet
+                executor.shutdown(wait=True, cancel_futures=True)
+    except KeyboardInterrupt:
+        logging.warning(f"Interrupted: {len(filenames) - len(reports)} tile(s) not processed")
+        log_summary(reports, time.perf_counter() - start)
+        raise
+
+    log_summary(reports, time.perf_counter() - start)
+
+    failures = [report.filename for report in reports if report.error]
+    if failures:
+        raise RuntimeError(f"Processing failed for {len(failures)} tile(s): {', '.join(sorted(failures))}")
+
+    return {report.filename: report.result for report in reports}
@@ -3,46 +3,139 @@
 """
 import geopandas as gpd
 import numpy as np
+import shapely
 from rasterio.features import shapes as rasterio_shapes
 from rasterio.transform import from_origin
 from shapely.geometry import shape as shapely_shape
 
 from lidro.create_mask_hydro.rasters.create_mask_raster import detect_hydro_by_tile
 
+# Extension of the masks by tile for each supported vector driver. FlatGeobuf is a binary format that is
+# much faster to write and read than GeoJSON on large blocks.
+VECTOR_EXTENSIONS = {"GeoJSON": ".GeoJSON", "FlatGeobuf": ".fgb"}
+
+# name (without extension) of the mask vectorized from the mosaic of all the tiles
+MOSAIC_BASENAME = "MaskHydro_mosaic"
+
+# size (in pixels) of the windows of the mosaic that are vectorized one after another
+MOSAIC_WINDOW_SIZE = 4096
+
+
+def vectorize_binary_image(binary_image: np.array, origin: tuple, pixel_size: float) -> list:
+    """Convert the pixels with a value different from 0 in a binary image into polygons
+
+    Args:
+        binary_image (np.array): 2D binary array (upper row first)
+        origin (tuple): coordinates of the top left corner of the image
+        pixel_size (float): size of the pixels (in meters)
+
+    Returns:
+        list: list of shapely polygons
+    """
+    # Calculate "transform"
+    transform = from_origin(origin[0], origin[1], pixel_size, pixel_size)
+
+    # Convert binary image to vector
+    return [
+        shapely_shape(shapedict)
+        for shapedict, value in rasterio_shapes(
+            binary_image.astype(np.uint8, copy=False), mask=None, connectivity=8, transform=transform
+        )
+        if value != 0
+    ]
+
 
 def create_hydro_vector_mask(
-    filename: str, output: str, pixel_size: float, tile_size: int, classes: list, crs: str, dilatation_size: int
+    filename: str,
+    output: str,
+    pixel_size: float,
+    tile_size: int,
+    classes: list,
+    crs: str,
+    dilatation_size: int,
+    chunk_size: int = None,
+    origin_from_header: bool = False,
+    driver: str = "GeoJSON",
 ):
     """Create a vector mask of hydro surfaces in a tile from the points classification of the input LAS/LAZ file,
-    and save it as a GeoJSON file.
+    and save it as a GeoJSON (or FlatGeobuf) file.
 
 
     Args:
         filename (str): path to the input pointcloud
-        output (str): path to output geoJSON
+        output (str): path to output vector file
         pixel_size (float): distance between each node of the intermediate raster grid (in meters)
         tile_size (int): size of the intermediate raster grid (in meters)
         classes (list): List of classes to consider as water (points with other classification values are ignored)
         crs (str): a pyproj CRS object used to create the output GeoJSON file
         dilatation_size (int): size for dilatation raster
+        chunk_size (int): if not None, the pointcloud is read by chunks of chunk_size points
+        origin_from_header (bool): if True, the tile origin is infered from the LAS header bounds
+        driver (str): vector driver of the output file (one of VECTOR_EXTENSIONS keys)
     """
     # Read a binary image representing hydrographic surface(s)
-    binary_image, pcd_origin = detect_hydro_by_tile(filename, tile_size, pixel_size, classes, dilatation_size)
-
-    # Extract origin
-    origin_x = pcd_origin[0]
-    origin_y = pcd_origin[1]
-    # Calculate "transform"
-    transform = from_origin(origin_x, origin_y, pixel_size, pixel_size)
+    binary_image, pcd_origin = detect_hydro_by_tile(
+        filename, tile_size, pixel_size, classes, dilatation_size, chunk_size, origin_from_header
+    )
 
     # Convert binary image to vector
-    geometry = [
-        shapely_shape(shapedict)
-        for shapedict, value in rasterio_shapes(
-            binary_image.astype(np.int16), mask=None, connectivity=8, transform=transform
-        )
-        if value != 0
-    ]
+    geometry = vectorize_binary_image(binary_image, pcd_origin, pixel_size)
+
     # save the result
     gdf = gpd.GeoDataFrame(geometry=geometry, crs=crs)
-    gdf.to_file(output, driver="GeoJSON", crs=crs)
+    gdf.to_file(output, driver=driver, crs=crs)
+
+
+def create_hydro_vector_mask_from_mosaic(
+    mosaic: np.array,
+    mosaic_origin: tuple,
+    pixel_size: float,
+    output: str,
+    crs: str,
+    driver: str = "GeoJSON",
+    window_size: int = MOSAIC_WINDOW_SIZE,
+):
+    """Vectorize a mosaic of the water masks of several tiles, and save it as a GeoJSON (or FlatGeobuf) file.
+    Polygons crossing tile borders are already stitched, so the merge stage does not have to union them.
+    The mosaic is vectorized by windows of window_size x window_size pixels, so that a memory-mapped mosaic
+    is never loaded at once: the polygons touching the border between 2 windows are then unioned.
+
+    Args:
+        mosaic (np.array): 2D binary array of the water presence on the whole block (upper row first)
+        mosaic_origin (tuple): coordinates of the top left corner of the mosaic
+        pixel_size (float): size of the pixels (in meters)
+        output (str): path to output vector file
+        crs (str): a pyproj CRS object used to create the output file
+        driver (str): vector driver of the output file (one of VECTOR_EXTENSIONS keys)
+        window_size (int): size of the windows (in pixels)
+    """
+    nb_rows, nb_cols = mosaic.shape
+    geometry, seam_polygons = [], []
+    for row in range(0, nb_rows, window_size):
+        for col in range(0, nb_cols, window_size):
+            row_end, col_end = min(row + window_size, nb_rows), min(col + window_size, nb_cols)
+            xmin, ymax = mosaic_origin[0] + col * pixel_size, mosaic_origin[1] - row * pixel_size
+            xmax, ymin = mosaic_origin[0] + col_end * pixel_size, mosaic_origin[1] - row_end * pixel_size
+            polygons = np.asarray(
+                vectorize_binary_image(mosaic[row:row_end, col:col_end], (xmin, ymax), pixel_size), dtype=object
+            )
+            if len(polygons) == 0:
+                continue
+
+            # polygons touching a border shared with another window
+            bounds = shapely.bounds(polygons)
+            tolerance = pixel_size / 2
+            on_seam = (
+                ((col > 0) & (bounds[:, 0] < xmin + tolerance))
+                | ((col_end < nb_cols) & (bounds[:, 2] > xmax - tolerance))
+                | ((row_end < nb_rows) & (bounds[:, 1] < ymin + tolerance))
+                | ((row > 0) & (bounds[:, 3] > ymax - tolerance))
+            )
+            geometry.extend(polygons[~on_seam])
+            seam_polygons.extend(polygons[on_seam])
+
+    if seam_polygons:
+        geometry.extend(shapely.get_parts(shapely.union_all(seam_polygons)))
+
+    gdf = gpd.GeoDataFrame(geometry=geometry, crs=crs)
+    gdf.to_file(output, driver=driver, crs=crs)
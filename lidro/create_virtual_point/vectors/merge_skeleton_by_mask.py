@@ -9,7 +9,7 @@ import pandas as pd
 from shapely import line_merge, set_precision
 
 from lidro.skeleton.branch import PRECISION
-from lidro.vectors.close_holes import close_holes
+from lidro.vectors.close_holes import close_holes_geoseries
 
 
 def explode_multipart(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
@@ -94,7 +94,7 @@ def merge_skeleton_by_mask(input_skeleton: str, input_mask_hydro: str, output_di
     gdf_mask_hydro = gpd.read_file(input_mask_hydro)
     gdf_mask_hydro = explode_multipart(gdf_mask_hydro)
     # Close holes in gdf_mask-hydro to prevent island from dividing a skeleton into multiple parts
-    gdf_mask_hydro["geometry"] = gdf_mask_hydro["geometry"].apply(close_holes)
+    gdf_mask_hydro["geometry"] = close_holes_geoseries(gdf_mask_hydro["geometry"])
     print("gdf_mask_hydro::", gdf_mask_hydro)
 
     gdf_combined = combine_skeletons(gdf_skeleton, gdf_mask_hydro, crs)
@@ -6,20 +6,141 @@ import os
 import sys
 
 import hydra
+import numpy as np
 from omegaconf import DictConfig
 from pyproj import CRS
 
 sys.path.append('../lidro')
 
-from lidro.create_mask_hydro.vectors.convert_to_vector import create_hydro_vector_mask
+from lidro.create_mask_hydro.rasters.mosaic import (  # noqa: E402
+    add_tile_to_mosaic,
+    get_mosaic_extent,
+    get_tiles_origins,
+)
+from lidro.create_mask_hydro.tile_executor import run_on_tiles  # noqa: E402
+from lidro.create_mask_hydro.vectors.convert_to_vector import (  # noqa: E402
+    MOSAIC_BASENAME,
+    VECTOR_EXTENSIONS,
+    create_hydro_vector_mask,
+    create_hydro_vector_mask_from_mosaic,
+)
+
+
+def main_on_one_tile(
+    filename: str,
+    input_dir: str,
+    output_dir: str,
+    pixel_size: float,
+    tile_size: int,
+    classe: list,
+    crs: CRS,
+    dilation_size: int,
+    chunk_size: int = None,
+    origin_from_header: bool = False,
+    driver: str = "GeoJSON",
+):
+    """Lauch main.py on one tile
+
+    Args:
+        filename (str): filename to the LAS file
+        input_dir (str): folder which contains the LAS file
+        output_dir (str): output folder
+        pixel_size (float): distance between each node of the raster grid (in meters)
+        tile_size (int): size of the raster grid (in meters)
+        classe (list): List of classes to consider as "non-water"
+        crs (CRS): a pyproj CRS object used to create the output GeoJSON file
+        dilation_size (int): size for dilatation raster
+        chunk_size (int): if not None, the pointcloud is read by chunks of chunk_size points
+        origin_from_header (bool): if True, the tile origin is infered from the LAS header bounds
+        driver (str): vector driver of the Mask Hydro file ("GeoJSON" or "FlatGeobuf")
+    """
+    tilename = os.path.splitext(filename)[0]  # filename to the LAS file
+    input_file = os.path.join(input_dir, filename)  # path to the LAS file
+    extension = VECTOR_EXTENSIONS[driver]
+    output_file = os.path.join(output_dir, f"MaskHydro_{tilename}{extension}")  # path to the Mask Hydro file
+    logging.info(f"\nCreate Mask Hydro 1 for tile : {tilename}")
+    create_hydro_vector_mask(
+        input_file,
+        output_file,
+        pixel_size,
+        tile_size,
+        classe,
+        crs,
+        dilation_size,
+        chunk_size,
+        origin_from_header,
+        driver,
+    )
+
+
+def main_on_mosaic(
+    filenames: list,
+    input_dir: str,
+    output_dir: str,
+    pixel_size: float,
+    tile_size: int,
+    classe: list,
+    crs: CRS,
+    dilation_size: int,
+    chunk_size: int = None,
+    origin_from_header: bool = False,
+    driver: str = "GeoJSON",
+    num_workers: int = 1,
+):
+    """Write the water masks of all the tiles in a single memory-mapped raster mosaic, then vectorize it once
+    (in MaskHydro_mosaic.GeoJSON or .fgb)
+
+    Args:
+        filenames (list): filenames of the LAS files
+        input_dir (str): folder which contains the LAS files
+        output_dir (str): output folder
+        pixel_size (float): distance between each node of the raster grid (in meters)
+        tile_size (int): size of the raster grid (in meters)
+        classe (list): List of classes to consider as "non-water"
+        crs (CRS): a pyproj CRS object used to create the output file
+        dilation_size (int): size for dilatation raster
+        chunk_size (int): if not None, the pointclouds are read by chunks of chunk_size points
+        origin_from_header (bool): if True, the tiles origins are infered from the LAS header bounds
+        driver (str): vector driver of the Mask Hydro file ("GeoJSON" or "FlatGeobuf")
+        num_workers (int): number of processes used to create the tiles masks
+    """
+    origins = get_tiles_origins(input_dir, filenames, tile_size, chunk_size, origin_from_header, num_workers)
+    mosaic_origin, mosaic_shape = get_mosaic_extent(list(origins.values()), tile_size, pixel_size)
+    logging.info(f"\nCreate Mask Hydro mosaic of {mosaic_shape[0]} x {mosaic_shape[1]} pixels")
+
+    mosaic_path = os.path.join(output_dir, f"{MOSAIC_BASENAME}.tmp")
+    np.memmap(mosaic_path, dtype=np.uint8, mode="w+", shape=mosaic_shape).flush()  # mosaic filled with 0
+    try:
+        tile_args = (
+            input_dir,
+            mosaic_path,
+            mosaic_origin,
+            mosaic_shape,
+            pixel_size,
+            tile_size,
+            classe,
+            dilation_size,
+            chunk_size,
+            origin_from_header,
+        )
+        run_on_tiles(add_tile_to_mosaic, filenames, tile_args, num_workers)
+
+        mosaic = np.memmap(mosaic_path, dtype=np.uint8, mode="r", shape=mosaic_shape)
+        output_file = os.path.join(output_dir, f"{MOSAIC_BASENAME}{VECTOR_EXTENSIONS[driver]}")
+        create_hydro_vector_mask_from_mosaic(mosaic, mosaic_origin, pixel_size, output_file, crs, driver)
+        del mosaic
+    finally:
+        os.remove(mosaic_path)
 
 
 @hydra.main(config_path="../configs/", config_name="configs_lidro.yaml", version_base="1.2")
 def main(config: DictConfig):
     """Create a vector mask of hydro surfaces from the points classification of the input LAS/LAZ file,
-    and save it as a GeoJSON file.
+    and save it as a GeoJSON (or FlatGeobuf) file.
 
-    It can run either on a single file, or on each file of a folder
+    It can run either on a single file, or on each file of a folder. In the latter case, tiles are processed
+    in parallel when config.io.num_workers is greater than 1, and if config.mask_generation.raster.mosaic is True,
+    the masks of all the tiles are gathered in a single raster before being vectorized at once.
 
     Args:
         config (DictConfig): hydra configuration (configs/configs_lidro.yaml by default)
@@ -48,29 +169,37 @@ def main(config: DictConfig):
     pixel_size = config.io.pixel_size
     tile_size = config.io.tile_size
     crs = CRS.from_user_input(config.io.srid)
-    classe = config.mask_generation.filter.keep_classes
+    classe = list(config.mask_generation.filter.keep_classes)
     dilation_size = config.mask_generation.raster.dilation_size
-
-    def main_on_one_tile(filename):
-        """Lauch main.py on one tile
-
-        Args:
-            filename (str): filename to the LAS file
-        """
-        tilename = os.path.splitext(filename)[0]  # filename to the LAS file
-        input_file = os.path.join(input_dir, filename)  # path to the LAS file
-        output_file = os.path.join(output_dir, f"MaskHydro_{tilename}.GeoJSON")  # path to the Mask Hydro file
-        logging.info(f"\nCreate Mask Hydro 1 for tile : {tilename}")
-        create_hydro_vector_mask(input_file, output_file, pixel_size, tile_size, classe, crs, dilation_size)
+    chunk_size = config.io.chunk_size
+    origin_from_header = config.io.origin_from_header
+    driver = config.io.vector_driver
+    if driver not in VECTOR_EXTENSIONS:
+        raise ValueError(f"config.io.vector_driver should be one of {list(VECTOR_EXTENSIONS)}, got {driver}")
+    tile_args = (
+        input_dir,
+        output_dir,
+        pixel_size,
+        tile_size,
+        classe,
+        crs,
+        dilation_size,
+        chunk_size,
+        origin_from_header,
+        driver,
+    )
 
     if initial_las_filename:
         # Lauch creating mask by one tile:
-        main_on_one_tile(initial_las_filename)
+        main_on_one_tile(initial_las_filename, *tile_args)
+
+    elif config.mask_generation.raster.mosaic:
+        # Lauch creating a single Mask Hydro from the mosaic of all the tiles
+        main_on_mosaic(sorted(os.listdir(input_dir)), *tile_args, num_workers=config.io.num_workers)
 
     else:
-        # Lauch creating Mask Hydro tile by tile
-        for file in os.listdir(input_dir):
-            main_on_one_tile(file)
+        # Lauch creating Mask Hydro tile by tile (in parallel if num_workers > 1)
+        run_on_tiles(main_on_one_tile, sorted(os.listdir(input_dir)), tile_args, config.io.num_workers)
 
 
 if __name__ == "__main__":
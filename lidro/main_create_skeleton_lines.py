@@ -1,6 +1,7 @@
 """ Main script for creating skeleton lines inside masks
 """
 
+import logging
 import os
 import sys
 from pathlib import Path
@@ -13,10 +14,16 @@ from shapely.geometry import Point
 
 sys.path.append("../lidro")
 
-from lidro.skeleton.branch import Branch, line_merge  # noqa: E402
+from lidro.skeleton.branch import line_merge  # noqa: E402
+from lidro.skeleton.bridge_cache import (  # noqa: E402
+    are_bridges_covering,
+    export_bridges,
+)
 from lidro.skeleton.create_skeleton_lines import (  # noqa: E402
     create_branches_list,
     create_branches_pair,
+    create_branches_skeleton,
+    db_connector,
     select_candidates,
 )
 
@@ -36,6 +43,21 @@ def run(config: DictConfig):
     gdf_hydro_global_mask = gpd.read_file(config.io.skeleton.mask_input_path)
     crs = gdf_hydro_global_mask.crs  # Load a crs from input
 
+    # export the bridges of the block once, if they are to be read from a local file: the file is exported again
+    # if it doesn't cover the mask (exported for another block, or for a smaller mask)
+    bridges_cache_path = config.skeleton.db_uni.bridges_cache_path
+    mask_bbox = gdf_hydro_global_mask.total_bounds
+    if (
+        config.skeleton.db_uni.db_using_db
+        and bridges_cache_path
+        and not are_bridges_covering(mask_bbox, bridges_cache_path)
+    ):
+        if os.path.isfile(bridges_cache_path):
+            logging.warning(f"The file of the bridges {bridges_cache_path} doesn't cover the mask: exported again")
+        os.makedirs(Path(bridges_cache_path).parent, exist_ok=True)
+        with db_connector(config) as db_conn:
+            export_bridges(mask_bbox, bridges_cache_path, crs, db_conn)
+
     branches_list = create_branches_list(config, gdf_hydro_global_mask, crs)
     branches_pair_list = create_branches_pair(config, branches_list)
     validated_candidates = select_candidates(config, branches_pair_list)
@@ -53,11 +75,7 @@ def run(config: DictConfig):
         candidate.branch_2.gap_points.append(Point(candidate.extremity_2))
 
     # get skeletons for all branches
-    for branch in branches_list:
-        branch: Branch
-        branch.create_skeleton()
-        branch.simplify()
-        branch.shorten_lines()
+    create_branches_skeleton(branches_list, config.io.num_workers)
 
     # putting all skeleton lines together, and save them if there is a path
     branch_lines_list = [branch.gdf_skeleton_lines for branch in branches_list]
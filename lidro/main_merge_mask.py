@@ -49,7 +49,10 @@ def main(config: DictConfig):
           config.mask_generation.vector.min_water_area, 
           config.mask_generation.vector.buffer_positive, 
           config.mask_generation.vector.buffer_negative, 
-          config.mask_generation.vector.tolerance)
+          config.mask_generation.vector.tolerance,
+          config.io.tile_size,
+          config.io.num_workers,
+          config.mask_generation.vector.incremental_merge)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+""" Union of the masks by tile, by groups of neighbouring tiles (2x2, then 4x4...)
+"""
+import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import fiona
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely import Geometry
+from shapely.ops import unary_union
+
+# tolerance (in meters) used to decide if a polygon touches the border of its cell
+BORDER_TOLERANCE = 1e-6
+
+
+def read_mask(path: str, crs: str) -> Geometry:
+    """Read a mask file and return the union of its geometries"""
+    return gpd.read_file(path, crs=crs).unary_union
+
+
+def read_mask_bounds(path: str) -> Optional[Tuple[float, float, float, float]]:
+    """Read the bounds of a mask file without creating its geometries (None if the mask is empty)"""
+    with fiona.open(path) as mask:
+        if len(mask) == 0:
+            return None
+        return mask.bounds
+
+
+def get_cell(geometry: Geometry, cell_size: float) -> Tuple[int, int]:
+    """Return the (column, row) of the cell of a grid of size cell_size that contains the center of the geometry"""
+    return get_bounds_cell(geometry.bounds, cell_size)
+
+
+def get_bounds_cell(bounds: Tuple[float, float, float, float], cell_size: float) -> Tuple[int, int]:
+    """Return the (column, row) of the cell of a grid of size cell_size that contains the center of the bounds"""
+    xmin, ymin, xmax, ymax = bounds
+    return int(np.floor((xmin + xmax) / 2 / cell_size)), int(np.floor((ymin + ymax) / 2 / cell_size))
+
+
+def is_inside_cell(
+    geometry: Geometry,
+    cell: Tuple[int, int],
+    cell_size: float,
+    strict: bool,
+    origin: Tuple[float, float] = (0, 0),
+) -> bool:
+    """Return True if the bounds of the geometry are inside the cell (without touching its border if strict),
+    on a grid starting at origin"""
+    return are_bounds_inside_cell(geometry.bounds, cell, cell_size, strict, origin)
+
+
+def are_bounds_inside_cell(
+    bounds: Tuple[float, float, float, float],
+    cell: Tuple[int, int],
+    cell_size: float,
+    strict: bool,
+    origin: Tuple[float, float] = (0, 0),
+) -> bool:
+    """Return True if the bounds are inside the cell (without touching its border if strict),
+    on a grid starting at origin"""
+    xmin, ymin, xmax, ymax = bounds
+    tolerance = BORDER_TOLERANCE if strict else -BORDER_TOLERANCE
+    return (
+        xmin > origin[0] + cell[0] * cell_size + tolerance
+        and ymin > origin[1] + cell[1] * cell_size + tolerance
+        and xmax < origin[0] + (cell[0] + 1) * cell_size - tolerance
+        and ymax < origin[1] + (cell[1] + 1) * cell_size - tolerance
+    )
+
+
+def union_cell(
+    geometries: List[Geometry],
+    cell: Tuple[int, int],
+    cell_size: float,
+    origin: Tuple[float, float],
+    split_finished: bool,
+    is_union: bool,
+) -> Tuple[List[Geometry], Geometry]:
+    """Union the geometries of a cell, and separate the polygons that are finished (i.e. that can not touch
+    the polygons of other cells, because they do not touch the border of the cell) from the others
+
+    Args:
+        geometries (List[Geometry]): geometries of the cell
+        cell (Tuple[int, int]): (column, row) of the cell
+        cell_size (float): size of the cell (in meters)
+        origin (Tuple[float, float]): origin of the grid of the cells
+        split_finished (bool): if False, all polygons are considered as not finished
+        is_union (bool): if True, a single geometry is already a union and is not unioned again
+
+    Returns:
+        List[Geometry]: finished polygons
+        Geometry: union of the other polygons
+    """
+    union = geometries[0] if is_union and len(geometries) == 1 else unary_union(geometries)
+    if not split_finished:
+        return [], union
+
+    parts = shapely.get_parts(union)
+    finished = np.array(
+        [is_inside_cell(part, cell, cell_size, strict=True, origin=origin) for part in parts], dtype=bool
+    )
+    if not finished.any():
+        return [], union
+    # the parts of a union are already disjoint: the other parts do not need to be unioned again
+    return list(parts[finished]), shapely.geometrycollections(parts[~finished])
+
+
+def _union_cell_args(args):
+    return union_cell(*args)
+
+
+def read_and_union_cell(
+    paths: List[str],
+    crs: str,
+    cell: Tuple[int, int],
+    cell_size: float,
+    origin: Tuple[float, float],
+    split_finished: bool,
+) -> Tuple[List[Geometry], Geometry]:
+    """Read the masks of a cell and union them (see union_cell): only the result goes back to the caller
+
+    Args:
+        paths (List[str]): paths to the masks of the cell
+        crs (str): a pyproj CRS object used to read the masks
+        cell (Tuple[int, int]): (column, row) of the cell
+        cell_size (float): size of the cell (in meters)
+        origin (Tuple[float, float]): origin of the grid of the cells
+        split_finished (bool): if False, all polygons are considered as not finished
+
+    Returns:
+        List[Geometry]: finished polygons
+        Geometry: union of the other polygons
+    """
+    geometries = [read_mask(path, crs) for path in paths]
+    return union_cell(geometries, cell, cell_size, origin, split_finished, is_union=False)
+
+
+def _read_and_union_cell_args(args):
+    return read_and_union_cell(*args)
+
+
+def hierarchical_union(
+    paths: List[str], crs: str, tile_size: float, num_workers: int = 1, geometries: Optional[List[Geometry]] = None
+) -> List[Geometry]:
+    """Union the masks by tile by groups of neighbouring tiles on a grid: the tiles are first unioned by groups
+    of 2x2 tiles, then 4x4... until a single group remains.
+    At each level, the polygons that do not touch the border of their group can not be merged with any other
+    polygon: they are set apart and are not part of the next unions. Unions of a level run on a process pool
+    when num_workers > 1.
+    Only the bounds of the masks are read first: the masks of a group of 2x2 tiles are read by the process that
+    unions them, so that the masks of all the tiles are never held at once.
+
+    Args:
+        paths (List[str]): paths to the masks by tile
+        crs (str): a pyproj CRS object used to read the masks
+        tile_size (float): size of the tiles (in meters)
+        num_workers (int): number of processes
+        geometries (List[Geometry], optional): masks already read (union of each file of paths): paths are not read
+
+    Returns:
+        List[Geometry]: all the polygons of the union
+    """
+    executor = ProcessPoolExecutor(max_workers=num_workers) if num_workers and num_workers > 1 else None
+    map_function = executor.map if executor else map
+    try:
+        # the masks (paths to read, or geometries) with their bounds, without the empty ones
+        if geometries is None:
+            masks, bounds = paths, list(map_function(read_mask_bounds, paths))
+        else:
+            masks = geometries
+            bounds = [None if geometry is None or geometry.is_empty else geometry.bounds for geometry in geometries]
+        masks_bounds = [(mask, mask_bounds) for mask, mask_bounds in zip(masks, bounds) if mask_bounds is not None]
+        if not masks_bounds:
+            return []
+
+        # Polygons are set apart early only if each mask is inside its tile (otherwise, masks of different tiles
+        # could overlap far from the borders of their cells)
+        cells = [get_bounds_cell(mask_bounds, tile_size) for _, mask_bounds in masks_bounds]
+        split_finished = all(
+            are_bounds_inside_cell(mask_bounds, cell, tile_size, strict=False)
+            for (_, mask_bounds), cell in zip(masks_bounds, cells)
+        )
+        if not split_finished:
+            logging.warning("Some masks are not inside their tile: polygons are not set apart during the union")
+
+        # the cells are numbered from the first column and row of the tiles, so that grouping them by 2x2
+        # ends with a single group (even if the coordinates of the tiles are negative)
+        origin_cell = np.min(cells, axis=0).tolist()
+        origin = (origin_cell[0] * tile_size, origin_cell[1] * tile_size)
+        groups: Dict[Tuple[int, int], List] = defaultdict(list)
+        for (mask, _), cell in zip(masks_bounds, cells):
+            groups[((cell[0] - origin_cell[0]) // 2, (cell[1] - origin_cell[1]) // 2)].append(mask)
+
+        finished_polygons = []
+        cell_size = tile_size * 2
+        is_first_level = True
+        while True:
+            cells = list(groups.keys())
+            if is_first_level and geometries is None:
+                args = [(groups[cell], crs, cell, cell_size, origin, split_finished) for cell in cells]
+                results = list(map_function(_read_and_union_cell_args, args))
+            else:
+                # after the first level, a group with a single cell of the previous level is already unioned
+                is_union = not is_first_level
+                args = [(groups[cell], cell, cell_size, origin, split_finished, is_union) for cell in cells]
+                results = list(map_function(_union_cell_args, args))
+            for finished, _ in results:
+                finished_polygons.extend(finished)
+
+            if len(cells) == 1:
+                finished_polygons.extend(shapely.get_parts(results[0][1]))
+                break
+
+            # group the cells by 2x2 for the next level
+            groups = defaultdict(list)
+            for cell, (_, union) in zip(cells, results):
+                if not union.is_empty:
+                    groups[(cell[0] // 2, cell[1] // 2)].append(union)
+            if not groups:
+                break
+            cell_size *= 2
+            is_first_level = False
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return finished_polygons
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+""" Incremental merge: keep the state of the previous merge (signature of the masks by tile, water bodies
+before correction and the tiles they come from), so that only the water bodies touching changed tiles are merged
+again
+"""
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely import Geometry, STRtree, box
+from shapely.ops import unary_union
+
+from lidro.merge_mask_hydro.vectors.hierarchical_union import (
+    get_cell,
+    is_inside_cell,
+    read_mask,
+)
+
+INDEX_FILENAME = "MaskHydro_merge_index.json"
+COMPONENTS_FILENAME = "MaskHydro_merge_components.fgb"
+
+
+def get_file_signature(path: str) -> Dict:
+    """Return the modification time and the size of a file, used to detect the masks that changed"""
+    stat = os.stat(path)
+    return {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def describe_tile(geometry: Geometry, tile_size: float) -> Dict:
+    """Return the cell of the tile (None if its mask is empty), and whether its mask is inside this cell"""
+    if geometry is None or geometry.is_empty:
+        return {"cell": None, "inside": True}
+    cell = get_cell(geometry, tile_size)
+    return {"cell": list(cell), "inside": is_inside_cell(geometry, cell, tile_size, strict=False)}
+
+
+def get_tiles_description(
+    input_folder: str, files: List[str], crs: str, tile_size: float, previous_tiles: Optional[Dict] = None
+) -> Tuple[Dict, Set[str], Dict[str, Geometry]]:
+    """Describe the masks by tile (signature, cell) and find the ones that changed since the previous merge.
+    Only the masks that changed are read.
+
+    Args:
+        input_folder (str): folder which contains the masks by tile
+        files (List[str]): filenames of the masks by tile
+        crs (str): a pyproj CRS object used to read the masks
+        tile_size (float): size of the tiles (in meters)
+        previous_tiles (Dict, optional): description of the tiles at the previous merge (all tiles are read if None)
+
+    Returns:
+        Dict: description of each tile (signature, cell, inside)
+        Set[str]: tiles that are new, modified or removed since the previous merge
+        Dict[str, Geometry]: masks of the tiles that were read (new or modified)
+    """
+    previous_tiles = previous_tiles or {}
+    tiles, changed, geometries = {}, set(), {}
+    for file in files:
+        signature = get_file_signature(os.path.join(input_folder, file))
+        previous = previous_tiles.get(file)
+        if previous is not None and all(previous[key] == value for key, value in signature.items()):
+            tiles[file] = previous
+            continue
+        geometries[file] = read_mask(os.path.join(input_folder, file), crs)
+        tiles[file] = {**signature, **describe_tile(geometries[file], tile_size)}
+        changed.add(file)
+    changed.update(set(previous_tiles) - set(files))
+
+    return tiles, changed, geometries
+
+
+def get_cell_box(cell: List[int], tile_size: float) -> Geometry:
+    """Return the footprint of a cell of the tile grid"""
+    return box(cell[0] * tile_size, cell[1] * tile_size, (cell[0] + 1) * tile_size, (cell[1] + 1) * tile_size)
+
+
+def get_components_tiles(components: np.ndarray, tiles: Dict, tile_size: float) -> List[List[str]]:
+    """Return, for each water body, the tiles whose footprint intersects it"""
+    files = [file for file, tile in tiles.items() if tile["cell"] is not None]
+    if len(files) == 0 or len(components) == 0:
+        return [[] for _ in range(len(components))]
+    tree = STRtree([get_cell_box(tiles[file]["cell"], tile_size) for file in files])
+    component_indices, file_indices = tree.query(components, predicate="intersects")
+    components_tiles = [[] for _ in range(len(components))]
+    for component_index, file_index in zip(component_indices, file_indices):
+        components_tiles[component_index].append(files[file_index])
+    return [sorted(component_tiles) for component_tiles in components_tiles]
+
+
+def assign_components(polygons: np.ndarray, components: np.ndarray) -> np.ndarray:
+    """Return, for each corrected polygon, the index of the water body it comes from: the water body with the largest
+    intersection (or the nearest one, as buffers and simplification can move the polygon a bit)
+
+    Args:
+        polygons (np.ndarray): corrected polygons
+        components (np.ndarray): water bodies before correction
+
+    Returns:
+        np.ndarray: index of the water body of each polygon
+    """
+    result = np.full(len(polygons), -1, dtype=np.int64)
+    if len(polygons) == 0 or len(components) == 0:
+        return result
+
+    tree = STRtree(components)
+    polygon_indices, component_indices = tree.query(polygons, predicate="intersects")
+    areas = shapely.area(shapely.intersection(polygons[polygon_indices], components[component_indices]))
+    # sort by area so that the largest intersection is the last one to be written
+    order = np.argsort(areas, kind="stable")
+    result[polygon_indices[order]] = component_indices[order]
+
+    missing = np.flatnonzero(result < 0)
+    if len(missing):
+        polygon_indices, component_indices = tree.query_nearest(polygons[missing], all_matches=False)
+        result[missing[polygon_indices]] = component_indices
+    return result
+
+
+def update_components(
+    changed: Set[str],
+    previous_tiles: Dict,
+    tiles: Dict,
+    geometries: Dict[str, Geometry],
+    components: np.ndarray,
+    components_tiles: List[List[str]],
+    tile_size: float,
+) -> Tuple[np.ndarray, List[Geometry]]:
+    """Merge again the water bodies that touch the changed tiles.
+    The water bodies of the previous merge that come from a changed tile are removed, and the parts of them that come
+    from unchanged tiles are merged with the new masks of the changed tiles. Water bodies of the previous merge that
+    touch the result are merged too, until no other water body is touched.
+
+    Args:
+        changed (Set[str]): tiles that are new, modified or removed since the previous merge
+        previous_tiles (Dict): description of the tiles at the previous merge
+        tiles (Dict): description of the current tiles
+        geometries (Dict[str, Geometry]): masks of the new or modified tiles
+        components (np.ndarray): water bodies of the previous merge (before correction)
+        components_tiles (List[List[str]]): tiles of each water body of the previous merge
+        tile_size (float): size of the tiles (in meters)
+
+    Returns:
+        np.ndarray: indices of the water bodies of the previous merge that are kept
+        List[Geometry]: new water bodies
+    """
+    removed = np.array([bool(changed.intersection(component_tiles)) for component_tiles in components_tiles], bool)
+
+    # Footprints of the changed tiles (before and after the change)
+    cells = {
+        tuple(description[file]["cell"])
+        for description in (previous_tiles, tiles)
+        for file in changed
+        if file in description and description[file]["cell"] is not None
+    }
+    changed_footprint = unary_union([get_cell_box(cell, tile_size) for cell in cells])
+
+    # parts of the removed water bodies that come from unchanged tiles, and new masks of the changed tiles
+    pieces = list(shapely.difference(components[removed], changed_footprint))
+    pieces += [geometry for file, geometry in geometries.items() if geometry is not None and not geometry.is_empty]
+    pieces = [piece for piece in pieces if not piece.is_empty]
+
+    # Water bodies of the previous merge that touch the new pieces are merged with them
+    tree = STRtree(components) if len(components) else None
+    to_check = pieces
+    while tree is not None and to_check:
+        _, touched = tree.query(to_check, predicate="intersects")
+        touched = np.unique(touched)
+        touched = touched[~removed[touched]]
+        removed[touched] = True
+        to_check = list(components[touched])
+        pieces += to_check
+
+    new_components = list(shapely.get_parts(unary_union(pieces))) if pieces else []
+    logging.info(
+        f"Incremental merge: {len(changed)} changed tile(s), {int(removed.sum())} water bodies merged again "
+        f"into {len(new_components)}"
+    )
+    return np.flatnonzero(~removed), new_components
+
+
+def read_merge_index(output_folder: str, parameters: Dict) -> Optional[Dict]:
+    """Read the index of the previous merge, if it exists and was computed with the same parameters
+
+    Args:
+        output_folder (str): output folder of the merge
+        parameters (Dict): parameters of the merge
+
+    Returns:
+        Dict: index of the previous merge (parameters, tiles, tiles of each water body, water body of each polygon)
+    """
+    index_path = os.path.join(output_folder, INDEX_FILENAME)
+    if not os.path.isfile(index_path):
+        return None
+    with open(index_path, "r", encoding="utf-8") as file:
+        index = json.load(file)
+    if index["parameters"] != parameters:
+        logging.info("Parameters of the merge changed since the previous merge: all masks are merged again")
+        return None
+    return index
+
+
+def read_merge_components(output_folder: str, nb_components: int) -> Optional[np.ndarray]:
+    """Read the water bodies (before correction) of the previous merge
+
+    Args:
+        output_folder (str): output folder of the merge
+        nb_components (int): number of water bodies in the index of the previous merge
+
+    Returns:
+        np.ndarray: water bodies of the previous merge (None if they do not match the index)
+    """
+    if nb_components == 0:
+        return np.array([], dtype=object)
+
+    components_path = os.path.join(output_folder, COMPONENTS_FILENAME)
+    if not os.path.isfile(components_path):
+        logging.warning(f"{components_path} does not exist: all masks are merged again")
+        return None
+    # the features of a FlatGeobuf file are sorted by its spatial index: sort them back by id
+    gdf = gpd.read_file(components_path).sort_values("id")
+    if len(gdf) != nb_components:
+        logging.warning(f"{components_path} does not match the index of the merge: all masks are merged again")
+        return None
+    return np.asarray(gdf.geometry.values, dtype=object)
+
+
+def write_merge_index(
+    output_folder: str,
+    parameters: Dict,
+    tiles: Dict,
+    components: np.ndarray,
+    components_tiles: List[List[str]],
+    polygons_components: np.ndarray,
+    crs: str,
+):
+    """Write the state of the merge: the index (JSON) and the water bodies before correction (FlatGeobuf)
+
+    Args:
+        output_folder (str): output folder of the merge
+        parameters (Dict): parameters of the merge
+        tiles (Dict): description of the tiles
+        components (np.ndarray): water bodies (before correction)
+        components_tiles (List[List[str]]): tiles of each water body
+        polygons_components (np.ndarray): water body of each polygon of the merged mask
+        crs (str): a pyproj CRS object used to create the output file
+    """
+    components_path = os.path.join(output_folder, COMPONENTS_FILENAME)
+    if len(components):
+        gdf = gpd.GeoDataFrame({"id": np.arange(len(components))}, geometry=list(components), crs=crs)
+        gdf.to_file(components_path, driver="FlatGeobuf")
+    elif os.path.isfile(components_path):
+        os.remove(components_path)
+
+    index = {
+        "parameters": parameters,
+        "tiles": tiles,
+        "components_tiles": components_tiles,
+        "polygons_components": [int(component) for component in polygons_components],
+    }
+    with open(os.path.join(output_folder, INDEX_FILENAME), "w", encoding="utf-8") as file:
+        json.dump(index, file)
@@ -1,16 +1,139 @@
 # -*- coding: utf-8 -*-
 """ Merge
 """
+import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 import geopandas as gpd
-from shapely.ops import unary_union
+import numpy as np
+import pandas as pd
+from pyproj import CRS
 
+from lidro.create_mask_hydro.vectors.convert_to_vector import (
+    MOSAIC_BASENAME,
+    VECTOR_EXTENSIONS,
+)
 from lidro.merge_mask_hydro.vectors.check_rectify_geometry import (
     apply_buffers_to_geometry,
     fix_topology,
 )
-from lidro.vectors.close_holes import close_holes
+from lidro.merge_mask_hydro.vectors.hierarchical_union import hierarchical_union
+from lidro.merge_mask_hydro.vectors.incremental_merge import (
+    assign_components,
+    get_components_tiles,
+    get_tiles_description,
+    read_merge_components,
+    read_merge_index,
+    update_components,
+    write_merge_index,
+)
+from lidro.vectors.close_holes import close_holes_geoseries
+
+
+def post_process_polygons(
+    polygons: gpd.GeoSeries, buffer_positive: float, buffer_negative: float, tolerance: float, min_hole_area: float
+) -> gpd.GeoSeries:
+    """Correct the geometry of the water polygons: buffers, simplification, topology and small holes.
+    Each polygon is processed independently, so it can be applied by chunks of polygons.
+
+    Args:
+        polygons (gpd.GeoSeries): water polygons
+        buffer_positive (float): positive buffer to apply to the mask
+        buffer_negative (float): negative buffer to apply to the mask
+        tolerance (float): All parts of a simplified geometry will be no more
+                           than tolerance distance from the original.
+        min_hole_area (float): holes with an area smaller than min_hole_area are closed
+
+    Returns:
+        gpd.GeoSeries: corrected polygons
+    """
+    # Correct geometric errors: simplify certain shapes to make calculations easier
+    gdf = apply_buffers_to_geometry(polygons, buffer_positive, buffer_negative).explode(index_parts=False)
+    gdf = gdf.simplify(tolerance=tolerance, preserve_topology=True)
+
+    # Check and rectify the invalid geometry
+    gdf = fix_topology(gdf)
+
+    # Correction of holes in Hydrological Masks
+    return close_holes_geoseries(gdf, min_hole_area=min_hole_area)
+
+
+def _post_process_polygons_args(args):
+    return post_process_polygons(*args)
+
+
+def post_process_polygons_by_chunks(
+    polygons: gpd.GeoSeries,
+    buffer_positive: float,
+    buffer_negative: float,
+    tolerance: float,
+    min_hole_area: float,
+    num_workers: int = 1,
+) -> gpd.GeoSeries:
+    """Apply post_process_polygons by chunks of polygons on a process pool (in a single call if num_workers is 1)
+
+    Args:
+        polygons (gpd.GeoSeries): water polygons
+        buffer_positive (float): positive buffer to apply to the mask
+        buffer_negative (float): negative buffer to apply to the mask
+        tolerance (float): tolerance of the simplification
+        min_hole_area (float): holes with an area smaller than min_hole_area are closed
+        num_workers (int): number of processes
+
+    Returns:
+        gpd.GeoSeries: corrected polygons
+    """
+    if num_workers is None or num_workers <= 1 or len(polygons) <= 1:
+        return post_process_polygons(polygons, buffer_positive, buffer_negative, tolerance, min_hole_area)
+
+    # several chunks by worker, to balance the load between big and small polygons
+    nb_chunks = min(len(polygons), num_workers * 4)
+    chunks = [polygons.iloc[indices] for indices in np.array_split(np.arange(len(polygons)), nb_chunks)]
+    args = [(chunk, buffer_positive, buffer_negative, tolerance, min_hole_area) for chunk in chunks]
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        results = list(executor.map(_post_process_polygons_args, args))
+
+    # duplicates are removed by chunk in fix_topology: remove the ones between chunks
+    gs = gpd.GeoSeries(pd.concat(results, ignore_index=True), crs=polygons.crs)
+    return gs.drop_duplicates(ignore_index=True)
+
+
+def correct_water_bodies(
+    components: gpd.GeoSeries,
+    min_water_area: int,
+    buffer_positive: float,
+    buffer_negative: float,
+    tolerance: float,
+    num_workers: int = 1,
+) -> gpd.GeoDataFrame:
+    """Filter and correct the water bodies resulting from the union of the masks
+
+    Args:
+        components (gpd.GeoSeries): water bodies (polygons) resulting from the union
+        min_water_area (int): keep only water objects with area bigger than min_water_area
+        buffer_positive (float): positive buffer to apply to the mask
+        buffer_negative (float): negative buffer to apply to the mask
+        tolerance (float): tolerance of the simplification
+        num_workers (int): number of processes used for the correction of the polygons (serial if 1)
+
+    Returns:
+        gpd.GeoDataFrame: corrected water polygons
+    """
+    crs = components.crs
+    # keep only water's area (> 150 m² by default)
+    gdf = components[components.area > min_water_area]
+
+    # Correct geometric errors, check and rectify the invalid geometry, and close holes (< 100m²),
+    # polygon by polygon
+    gs = post_process_polygons_by_chunks(
+        gdf, buffer_positive, buffer_negative, tolerance, min_hole_area=100, num_workers=num_workers
+    )
+    gdf = gpd.GeoDataFrame(geometry=gs, crs=crs)
+
+    # filter out water area < min_water_area (150 m² by default) again to make sure
+    # that previous geometry updates did not generate new small water areas
+    return gdf[gdf.geometry.area > min_water_area]
 
 
 def merge_geom(
@@ -21,13 +144,16 @@ def merge_geom(
     buffer_positive: float,
     buffer_negative: float,
     tolerance: float,
+    tile_size: int = 1000,
+    num_workers: int = 1,
+    incremental: bool = False,
 ):
     """Merge several masks of hydro surfaces from the points classification
        of the input LAS/LAZ files from input_folder,
        filter mask (keep only water's area > min_water_area) and save it as a GeoJSON file.
 
     Args:
-        input_folder (str): folder which contains several geojson geometries
+        input_folder (str): folder which contains several geojson (or flatgeobuf) geometries
         output_folder (str): output folder
         crs (str): a pyproj CRS object used to create the output GeoJSON file
         min_water_area (int): filter Mask Hydro : keep only water objects with area bigger
@@ -36,35 +162,94 @@ def merge_geom(
         buffer_negative (int): negative buffer to apply to the mask
         tolerance (float): All parts of a simplified geometry will be no more
                            than tolerance distance from the original.
+        tile_size (int): size of the tiles (in meters), used to group the masks by tile for the union
+        num_workers (int): number of processes used for the union and the correction of the polygons (serial if 1)
+        incremental (bool): if True, the state of the merge is saved in output_folder, and only the water bodies
+                            touching the masks that changed since the previous merge are merged again
     """
     # Browse all files in folder
-    gdf = [
-        gpd.read_file(os.path.join(input_folder, file), crs=crs).unary_union
-        for file in os.listdir(input_folder)
-        if file.endswith(".GeoJSON")
-    ]
+    files = sorted(file for file in os.listdir(input_folder) if file.endswith(tuple(VECTOR_EXTENSIONS.values())))
+    output_path = os.path.join(output_folder, "MaskHydro_merge.geojson")
+    parameters = {
+        "crs": CRS.from_user_input(crs).to_string(),
+        "min_water_area": min_water_area,
+        "buffer_positive": buffer_positive,
+        "buffer_negative": buffer_negative,
+        "tolerance": tolerance,
+        "tile_size": tile_size,
+    }
 
-    # Union geometry
-    gdf = unary_union(gdf)
-    gdf = gpd.GeoSeries(gdf, crs=crs).explode(index_parts=False)
+    index = read_merge_index(output_folder, parameters) if incremental and os.path.isfile(output_path) else None
+    if incremental:
+        tiles, changed, geometries = get_tiles_description(
+            input_folder, files, crs, tile_size, index["tiles"] if index else None
+        )
+        if not all(tile["inside"] for tile in tiles.values()):
+            logging.warning("Some masks are not inside their tile: all masks are merged again")
+            index = None
+        elif index is not None and not changed:
+            logging.info("No mask changed since the previous merge")
+            return
 
-    # keep only water's area (> 150 m² by default)
-    gdf = gdf[gdf.geometry.area > min_water_area]
+    previous_components = None
+    if index is not None:
+        previous_gdf = gpd.read_file(output_path)
+        if len(previous_gdf) == len(index["polygons_components"]):
+            previous_components = read_merge_components(output_folder, len(index["components_tiles"]))
+        else:
+            logging.warning(f"{output_path} does not match the index of the merge: all masks are merged again")
 
-    # Correct geometric errors: simplify certain shapes to make calculations easier
-    gdf = apply_buffers_to_geometry(gdf, buffer_positive, buffer_negative).explode(index_parts=False)
-    gdf = gdf.simplify(tolerance=tolerance, preserve_topology=True)
+    if previous_components is not None:
+        previous_polygons_components = np.asarray(index["polygons_components"], dtype=np.int64)
+        kept, new_components = update_components(
+            changed, index["tiles"], tiles, geometries, previous_components, index["components_tiles"], tile_size
+        )
+        new_gdf = correct_water_bodies(
+            gpd.GeoSeries(new_components, crs=crs),
+            min_water_area,
+            buffer_positive,
+            buffer_negative,
+            tolerance,
+            num_workers,
+        )
 
-    # Check and rectify the invalid geometry
-    gdf = fix_topology(gdf)
+        # polygons of the kept water bodies are not corrected again
+        is_kept = np.isin(previous_polygons_components, kept)
+        gdf = gpd.GeoDataFrame(
+            geometry=pd.concat([previous_gdf.geometry[is_kept], new_gdf.geometry], ignore_index=True), crs=crs
+        )
+        new_components = np.asarray(new_components, dtype=object)
+        components = np.concatenate([previous_components[kept], new_components])
+        components_tiles = [index["components_tiles"][i] for i in kept]
+        components_tiles += get_components_tiles(new_components, tiles, tile_size)
+        new_polygons_components = assign_components(np.asarray(new_gdf.geometry.values, dtype=object), new_components)
+        polygons_components = np.concatenate(
+            [np.searchsorted(kept, previous_polygons_components[is_kept]), new_polygons_components + len(kept)]
+        )
+    else:
+        if len(files) == 1 and os.path.splitext(files[0])[0] == MOSAIC_BASENAME:
+            # A single mask vectorized from a mosaic of all the tiles: its polygons come from a single raster,
+            # so they are already disjoint and only need to be made valid (as the union would do)
+            components = gpd.read_file(os.path.join(input_folder, files[0]), crs=crs).geometry
+            components = components.make_valid().explode(index_parts=False)
+        else:
+            # Union geometry, by groups of neighbouring tiles
+            paths = [os.path.join(input_folder, file) for file in files]
+            # (masks already read to describe the tiles are not read again)
+            masks = [geometries[file] for file in files] if incremental and len(geometries) == len(files) else None
+            components = hierarchical_union(paths, crs, tile_size, num_workers, masks)
+            components = gpd.GeoSeries(components, crs=crs).explode(index_parts=False)
 
-    # Correction of holes (< 100m²) in Hydrological Masks
-    gs = gdf.geometry.apply(lambda p: close_holes(p, min_hole_area=100))
-    gdf = gpd.GeoDataFrame(geometry=gs, crs=crs)
+        gdf = correct_water_bodies(
+            components, min_water_area, buffer_positive, buffer_negative, tolerance, num_workers
+        )
 
-    # filter out water area < min_water_area (150 m² by default) again to make sure
-    # that previous geometry updates did not generate new small water areas
-    gdf = gdf[gdf.geometry.area > min_water_area]
+        if incremental:
+            components = np.asarray(components.values, dtype=object)
+            components_tiles = get_components_tiles(components, tiles, tile_size)
+            polygons_components = assign_components(np.asarray(gdf.geometry.values, dtype=object), components)
 
     # save the result
-    gdf.to_file(os.path.join(output_folder, "MaskHydro_merge.geojson"), driver="GeoJSON", crs=crs)
+    gdf.to_file(output_path, driver="GeoJSON", crs=crs)
+    if incremental:
+        write_merge_index(output_folder, parameters, tiles, components, components_tiles, polygons_components, crs)
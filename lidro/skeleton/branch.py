@@ -1,17 +1,22 @@
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 from itertools import product
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 import geopandas as gpd
 import numpy as np
 import pandas as pd
+import shapely
 from geopandas.geodataframe import GeoDataFrame
 from omegaconf import DictConfig
 from pyproj.crs.crs import CRS
-from shapely import Geometry, LineString, Point, set_precision
-from shapely.geometry import MultiLineString, Polygon
+from scipy.spatial import cKDTree
+from shapely import LineString, MultiPoint, Point, box, set_precision
+from shapely.geometry import Polygon
 from shapely.ops import linemerge, voronoi_diagram
 
+from lidro.skeleton.skeleton_graph import SkeletonGraph
+
 PRECISION = 0.001
 
 
@@ -53,6 +58,7 @@ class Branch:
         self.set_gdf_branch_mask(branch_mask)
         self.gap_points = []  # will contain points on the exterior that are connected to close gaps
         self.df_all_coords = get_df_points_from_gdf(self.gdf_branch_mask)
+        self.coords_tree = None  # KD-tree of df_all_coords, see get_coords_tree
 
     def set_gdf_branch_mask(self, branch_mask: GeoDataFrame):
         """
@@ -79,29 +85,29 @@ class Branch:
             return
 
         # draw a new line for each point added to close gaps to the nearest points on voronoi_lines
-        np_points = get_df_points_from_gdf(voronoi_lines).to_numpy().transpose()
-        for gap_point in self.gap_points:
-            distance_squared = (np_points[0] - gap_point.x) ** 2 + (np_points[1] - gap_point.y) ** 2
-            min_index = np.unravel_index(np.argmin(distance_squared, axis=None), distance_squared.shape)[0]
-            line_to_close_the_gap = LineString([gap_point, Point(np_points[0][min_index], np_points[1][min_index])])
-            voronoi_lines.loc[len(voronoi_lines)] = line_to_close_the_gap
+        # (the nearest points of all the gap points are found at once with a KD-tree)
+        if self.gap_points:
+            np_points = get_df_points_from_gdf(voronoi_lines).to_numpy()
+            np_gap_points = np.array([(gap_point.x, gap_point.y) for gap_point in self.gap_points])
+            _, nearest_indexes = cKDTree(np_points).query(np_gap_points)
+            lines_to_close_the_gaps = shapely.linestrings(
+                np.stack((np_gap_points, np_points[nearest_indexes]), axis=1)
+            )
+            gdf_lines_to_close_the_gaps = gpd.GeoDataFrame(geometry=lines_to_close_the_gaps, crs=self.crs)
+            voronoi_lines = pd.concat([voronoi_lines, gdf_lines_to_close_the_gaps], ignore_index=True)
 
         self.gdf_skeleton_lines = line_merge(voronoi_lines, self.crs)
 
     def simplify(self):
         """
-        removes useless lines from skeleton_lines
+        removes useless lines from skeleton_lines (the lines are removed and merged on a graph of the skeleton,
+        see SkeletonGraph)
         """
-        old_number_of_lines = len(self.gdf_skeleton_lines)
-        while old_number_of_lines > 1:
-            # we will exit the loop when there is only 1 line left
-            # or it cannot be simplify anymore (the number of lines cease to vary)
-            self.remove_extra_lines()
-            self.gdf_skeleton_lines = line_merge(self.gdf_skeleton_lines, self.crs)
-            if len(self.gdf_skeleton_lines) != old_number_of_lines:
-                old_number_of_lines = len(self.gdf_skeleton_lines)
-            else:
-                break
+        if len(self.gdf_skeleton_lines) <= 1:
+            return
+        skeleton_graph = SkeletonGraph(self.gdf_skeleton_lines["geometry"].values)
+        skeleton_graph.simplify(self.config.skeleton.branch.water_min_size, self.gap_points)
+        self.gdf_skeleton_lines = gpd.GeoDataFrame(geometry=skeleton_graph.get_lines(), crs=self.crs)
 
     def distance_to_a_branch(self, other_branch: "Branch") -> float:
         """
@@ -117,143 +123,53 @@ class Branch:
         Args:
             - other_branch (Branch): the other branch we want the distance to
         """
-        np_all_x = self.df_all_coords["x"].to_numpy()
-        np_all_y = self.df_all_coords["y"].to_numpy()
-        other_all_x = other_branch.df_all_coords["x"].to_numpy()
-        other_all_y = other_branch.df_all_coords["y"].to_numpy()
-
-        # create 2 numpy matrix with all x, y from self, minus all x, y from the other
-        x_diff = np_all_x - other_all_x[:, np.newaxis]
-        y_diff = np_all_y - other_all_y[:, np.newaxis]
-
-        distance_squared = x_diff**2 + y_diff**2
-        # index = np.unravel_index(np.argmax(distance_squared), distance_squared.shape)
-        # sort all the distances and get their indexes
-        indexes = np.unravel_index(np.argsort(distance_squared, axis=None), distance_squared.shape)
-
-        # search for the best candidates to close gaps
-        candidates = []
-        for index, (other_index, self_index) in enumerate(zip(indexes[0], indexes[1])):
-            # stop if we have enough candidates
-            if index >= self.config.skeleton.branch.max_gap_candidates:
-                break
-            # stop if the following candidates
-            if (
-                distance_squared[other_index][self_index]
-                > self.config.skeleton.max_gap_width * self.config.skeleton.max_gap_width
-            ):
-                break
-
-            candidates.append(
-                Candidate(
-                    self,
-                    other_branch,
-                    (self.df_all_coords["x"][self_index], self.df_all_coords["y"][self_index]),
-                    (other_branch.df_all_coords["x"][other_index], other_branch.df_all_coords["y"][other_index]),
-                    distance_squared[other_index][self_index],
-                )
+        max_gap_candidates = self.config.skeleton.branch.max_gap_candidates
+        max_gap_width = self.config.skeleton.max_gap_width
+        np_self_xy = self.df_all_coords[["x", "y"]].to_numpy()
+        np_other_xy = other_branch.df_all_coords[["x", "y"]].to_numpy()
+        if max_gap_candidates <= 0 or len(np_self_xy) == 0 or len(np_other_xy) == 0:
+            return []
+
+        # the best candidates are among the nearest points (in the other branch) of each point of self:
+        # the nearest points are searched with a KD-tree, instead of computing all the distances between points
+        k = min(max_gap_candidates, len(np_other_xy))
+        _, other_indexes = other_branch.get_coords_tree().query(
+            np_self_xy, k=k, distance_upper_bound=np.nextafter(max_gap_width, np.inf)
+        )
+        other_indexes = other_indexes.reshape(len(np_self_xy), k)
+        self_indexes = np.repeat(np.arange(len(np_self_xy)), k)
+        other_indexes = other_indexes.ravel()
+        is_found = other_indexes < len(np_other_xy)  # missing neighbours have an index equal to the number of points
+        self_indexes, other_indexes = self_indexes[is_found], other_indexes[is_found]
+
+        # sort the pairs by distance (then by other index and self index, as in a matrix others x self)
+        distance_squared = (np_self_xy[self_indexes, 0] - np_other_xy[other_indexes, 0]) ** 2 + (
+            np_self_xy[self_indexes, 1] - np_other_xy[other_indexes, 1]
+        ) ** 2
+        order = np.lexsort((self_indexes, other_indexes, distance_squared))
+        order = order[distance_squared[order] <= max_gap_width * max_gap_width][:max_gap_candidates]
+
+        # the best candidates to close gaps
+        return [
+            Candidate(
+                self,
+                other_branch,
+                (np_self_xy[self_index, 0], np_self_xy[self_index, 1]),
+                (np_other_xy[other_index, 0], np_other_xy[other_index, 1]),
+                distance,
             )
-        return candidates
-
-    def remove_extra_lines(self):
-        """
-        removes the 'spikes" (the lone lines going outward) from a skeleton.
-        Keeps the extremities of long enough lines
-        """
-        vertices_dict = get_vertices_dict(self.gdf_skeleton_lines)
-
-        lines_to_remove = []
-        for vertex, line_list in vertices_dict.items():
-
-            if len(line_list) == 1:
-                continue
-
-            # if len(line_list) is not 1, then it's probably 3 because
-            # it can't be 2 because of the previous merge and it's very unlikely to be 4+
-            lines_to_keep = []
-            lines_that_can_be_removed = []
-            for line in line_list:
-                if self.can_line_be_removed(line, vertices_dict):
-                    lines_that_can_be_removed.append(line)
-                else:
-                    lines_to_keep.append(line)
-
-            # if no line can be removed, we continue
-            if not lines_that_can_be_removed:
-                continue
-
-            # there is only 1 line that can be removed and 2+ to be kept, so we remove it
-            if len(lines_that_can_be_removed) == 1:
-                lines_to_remove.append(lines_that_can_be_removed[0])
-                continue
+            for self_index, other_index, distance in zip(
+                self_indexes[order], other_indexes[order], distance_squared[order]
+            )
+        ]
 
-            # strange case where 3+ lines are together, but isolated from the rest of the world
-            # we decide to keep the longuest line
-            if len(lines_to_keep) == 0:
-                max_distance = max([line.length for line in lines_that_can_be_removed])
-                for index_line, line in enumerate(lines_that_can_be_removed):
-                    if line.length == max_distance:
-                        lines_that_can_be_removed.pop(index_line)
-                        lines_to_keep.append(line)
-
-            # at least 2 lines can be removed, we will keep the one forming the straightest line with
-            # a line to keep, we assume it's the most likely to "continue" the river
-            min_dot_product = 1
-            line_that_should_not_be_removed = None
-            for line_to_keep, line_that_can_be_removed in product(lines_to_keep, lines_that_can_be_removed):
-                if vertex == line_to_keep.boundary.geoms[0]:
-                    vector_to_keep = np.array(line_to_keep.boundary.geoms[1].coords[0]) - np.array(vertex.coords[0])
-                else:
-                    vector_to_keep = np.array(line_to_keep.boundary.geoms[0].coords[0]) - np.array(vertex.coords[0])
-
-                if vertex == line_that_can_be_removed.boundary.geoms[0]:
-                    vector_to_remove = np.array(line_that_can_be_removed.boundary.geoms[1].coords[0]) - np.array(
-                        vertex.coords[0]
-                    )
-                else:
-                    vector_to_remove = np.array(line_that_can_be_removed.boundary.geoms[0].coords[0]) - np.array(
-                        vertex.coords[0]
-                    )
-
-                length_to_keep = np.linalg.norm(vector_to_keep)
-                length_to_remove = np.linalg.norm(vector_to_remove)
-                if not length_to_keep or not length_to_remove:  # length = 0, probably won't happen
-                    continue
-
-                vector_to_keep = vector_to_keep / length_to_keep
-                vector_to_remove = vector_to_remove / length_to_remove
-                dot_product = np.dot(vector_to_keep, vector_to_remove)
-                #  the smallest dot product (which should be negative) is the straightest couple of lines
-                if dot_product < min_dot_product:
-                    min_dot_product = dot_product
-                    line_that_should_not_be_removed = line_that_can_be_removed
-
-            lines_that_can_be_removed.remove(line_that_should_not_be_removed)
-            lines_to_remove += lines_that_can_be_removed
-
-        # set the lines without the lines to remove
-        self.gdf_skeleton_lines = self.gdf_skeleton_lines[~self.gdf_skeleton_lines["geometry"].isin(lines_to_remove)]
-
-    def can_line_be_removed(self, line: Geometry, vertices_dict: Dict[Point, List[LineString]]):
+    def get_coords_tree(self) -> cKDTree:
         """
-        Returns true if a line can be removed
-        Args:
-            - line (Geometry) : the line to test
-            - vertices_dict (Dict[Point, List[LineString]]) : a dictionary off all the
-            lines with a point as an extremity
+        returns a KD-tree of the points of the mask (built at the first call)
         """
-        if line.length > self.config.skeleton.branch.water_min_size:
-            return False
-
-        point_a, point_b = line.boundary.geoms[0], line.boundary.geoms[1]
-        # if an extremity is used to close a gap, wde keep it
-        if point_a in self.gap_points or point_b in self.gap_points:
-            return False
-
-        # if both extremities of the line is connected to another line, we can't remove that line
-        if len(vertices_dict[point_a]) > 1 and len(vertices_dict[point_b]) > 1:
-            return False
-        return True
+        if self.coords_tree is None:
+            self.coords_tree = cKDTree(self.df_all_coords[["x", "y"]].to_numpy())
+        return self.coords_tree
 
     def __repr__(self):
         return str(self.branch_id)
@@ -265,86 +181,257 @@ class Branch:
         # divide geometry into segments no longer than max_segment_length
         united_geom = self.gdf_branch_mask["geometry"].unary_union
         segmentize_geom = united_geom.segmentize(max_segment_length=self.config.skeleton.branch.voronoi_max_length)
-        # Create the voronoi diagram and only keep polygon
-        regions = voronoi_diagram(segmentize_geom, envelope=segmentize_geom, tolerance=0.0, edges=True)
 
-        # remove Voronoi lines exterior to the mask
-        geometry = gpd.GeoSeries(regions.geoms, crs=self.crs).explode(index_parts=False)
+        window_size = self.config.skeleton.branch.voronoi_window_size
+        xmin, ymin, xmax, ymax = segmentize_geom.bounds
+        if window_size and max(xmax - xmin, ymax - ymin) > window_size:
+            # long branch: the voronoi diagram is computed by windows
+            edges = create_tiled_voronoi_edges(
+                shapely.get_coordinates(segmentize_geom),
+                window_size,
+                self.config.skeleton.branch.voronoi_window_overlap,
+                self.config.skeleton.branch.voronoi_num_workers,
+            )
+            geometry = gpd.GeoSeries(edges, crs=self.crs)
+        else:
+            # Create the voronoi diagram and only keep polygon
+            regions = voronoi_diagram(segmentize_geom, envelope=segmentize_geom, tolerance=0.0, edges=True)
+            geometry = gpd.GeoSeries(regions.geoms, crs=self.crs).explode(index_parts=False)
+
+        # remove Voronoi lines exterior to the mask: there is only one polygon, so it is prepared once and
+        # all the lines are tested at once (instead of a spatial join)
+        branch_mask = self.gdf_branch_mask["geometry"][0]
+        shapely.prepare(branch_mask)
+        lines = np.asarray(geometry.values, dtype=object)
+        # only keeps lines "Within" gdf_branch_mask (the prepared geometry must be the first argument)
+        lines_filter = lines[shapely.contains(branch_mask, lines)]
 
-        df = gpd.GeoDataFrame(geometry=geometry, crs=self.crs)
-        lines_filter = df.sjoin(self.gdf_branch_mask, predicate="within")  # only keeps lines "Within" gdf_branch_mask
         # save Voronoi lines
-        lines_filter = lines_filter.reset_index(drop=True)  # Réinitialiser l'index
-        lines_filter = lines_filter.drop(columns=["index_right"])  # Supprimer la colonne 'index_right'
-
-        return gpd.GeoDataFrame(lines_filter, crs=self.crs)
+        return gpd.GeoDataFrame(geometry=gpd.GeoSeries(lines_filter, crs=self.crs))
 
     def shorten_lines(self):
-        vertices_dict = get_vertices_dict(self.gdf_skeleton_lines)
+        vertices_dict = get_vertices_positions_dict(self.gdf_skeleton_lines)
 
-        single_cut_dict = {}
-        double_cut_list = []
+        single_cut_dict = {}  # position of the line -> vertex to cut
+        double_cut_list = []  # positions of the lines
 
-        for vertex, line_list in vertices_dict.items():
+        for vertex, position_list in vertices_dict.items():
 
             # we care only about lines that are extremities (i.e: with no other line on the same vertex)
-            if not len(line_list) == 1:
+            if not len(position_list) == 1:
                 continue
 
             # determine with the line is cut both ends (i.e: the line has twice an extremity)
-            line = line_list[0]
-            if line in single_cut_dict:
-                single_cut_dict.pop(line)
-                double_cut_list.append(line)
+            position = position_list[0]
+            if position in single_cut_dict:
+                single_cut_dict.pop(position)
+                double_cut_list.append(position)
             else:
-                single_cut_dict[line] = vertex
-
-        # single cut
-        for line, vertex in single_cut_dict.items():
-            start_point = Point(line.coords[0])
-            end_point = Point(line.coords[-1])
-            if start_point == vertex:
-                new_line = cut(line, self.config.skeleton.clipping_length)
-            elif end_point == vertex:
-                new_line = cut(LineString(reversed(line.coords)), self.config.skeleton.clipping_length)
-            self.gdf_skeleton_lines.loc[self.gdf_skeleton_lines["geometry"] == line, "geometry"] = new_line
+                single_cut_dict[position] = vertex
+
+        lines = np.array(self.gdf_skeleton_lines["geometry"].values, dtype=object)
+        clipping_length = self.config.skeleton.clipping_length
+
+        # single cut: the lines are reversed if the extremity is their ending point, and all cut at once
+        single_cut_positions = np.array(list(single_cut_dict.keys()), dtype=int)
+        single_cut_vertices = np.array([(vertex.x, vertex.y) for vertex in single_cut_dict.values()]).reshape(-1, 2)
+        start_points = shapely.get_coordinates(shapely.get_point(lines[single_cut_positions], 0)).reshape(-1, 2)
+        is_start = (start_points == single_cut_vertices).all(axis=1)
+        single_cut_lines = np.where(
+            is_start, lines[single_cut_positions], shapely.reverse(lines[single_cut_positions])
+        )
+        lines[single_cut_positions] = cut_lines(single_cut_lines, np.full(len(single_cut_lines), clipping_length))
 
         # double cut
-        for line in double_cut_list:
-            new_line = cut_both_ends(line, self.config.skeleton.clipping_length)
-            self.gdf_skeleton_lines.loc[self.gdf_skeleton_lines["geometry"] == line, "geometry"] = new_line
+        double_cut_positions = np.array(double_cut_list, dtype=int)
+        lines[double_cut_positions] = cut_lines_both_ends(
+            lines[double_cut_positions], np.full(len(double_cut_positions), clipping_length)
+        )
 
-        self.gdf_skeleton_lines["geometry"] = set_precision(self.gdf_skeleton_lines["geometry"], PRECISION)
+        # the lines are written back by position, all at once
+        self.gdf_skeleton_lines["geometry"] = gpd.GeoSeries(
+            set_precision(lines, PRECISION), index=self.gdf_skeleton_lines.index, crs=self.crs
+        )
 
 
-def cut(line: LineString, distance: float) -> LineString:
-    """Cuts a line at a distance from its ending point. The minimum length left is 1"""
+def get_voronoi_edges_in_window(
+    sites: np.ndarray, window: Tuple[float, float, float, float], overlap: float
+) -> np.ndarray:
+    """
+    Returns the edges of the voronoi diagram of the sites whose middle is in a window. The diagram is computed only
+    with the sites in the window extended by overlap: as long as overlap is bigger than the width of the
+    river, the edges inside the river are the same as in the diagram of all the sites
+    Args:
+        - sites (np.ndarray): (N, 2) coordinates of the sites
+        - window (Tuple[float, float, float, float]): xmin, ymin, xmax, ymax of the window
+        - overlap (float): size of the margin around the window
+    """
+    xmin, ymin, xmax, ymax = window
+    in_extended_window = (
+        (sites[:, 0] >= xmin - overlap)
+        & (sites[:, 0] <= xmax + overlap)
+        & (sites[:, 1] >= ymin - overlap)
+        & (sites[:, 1] <= ymax + overlap)
+    )
+    if np.count_nonzero(in_extended_window) < 2:
+        return np.array([], dtype=object)
+
+    extended_window = box(xmin - overlap, ymin - overlap, xmax + overlap, ymax + overlap)
+    regions = voronoi_diagram(
+        MultiPoint(sites[in_extended_window]), envelope=extended_window, tolerance=0.0, edges=True
+    )
+    edges = shapely.get_parts(shapely.get_parts(regions))
+
+    # each edge belongs to the window that contains its middle (windows are half-open, so only one)
+    middles = shapely.get_coordinates(shapely.line_interpolate_point(edges, 0.5, normalized=True))
+    in_window = (middles[:, 0] >= xmin) & (middles[:, 0] < xmax) & (middles[:, 1] >= ymin) & (middles[:, 1] < ymax)
+    return edges[in_window]
+
+
+def _get_voronoi_edges_in_window_args(args):
+    return get_voronoi_edges_in_window(*args)
+
+
+def get_voronoi_windows(
+    sites: np.ndarray, window_size: float, overlap: float
+) -> List[Tuple[np.ndarray, Tuple[float, float, float, float]]]:
+    """
+    Returns the windows used to compute the voronoi diagram of the sites by windows, each one with the sites
+    of the window extended by overlap (and only them). The sites are put once in buckets by window, so that
+    the sites of a window are found in the buckets of its neighbours, without going through all the sites
+    Args:
+        - sites (np.ndarray): (N, 2) coordinates of the sites
+        - window_size (float): size of the windows
+        - overlap (float): size of the margin around each window
+    Returns:
+        - a list of (sites of the extended window, (xmin, ymin, xmax, ymax) of the window)
+    """
+    sites = np.unique(sites, axis=0)
+    origin = sites.min(axis=0)
+    cells = np.floor((sites - origin) / window_size).astype(int)
+
+    # buckets of sites by window
+    order = np.lexsort((cells[:, 1], cells[:, 0]))
+    used_cells, starts, counts = np.unique(cells[order], axis=0, return_index=True, return_counts=True)
+    buckets = {
+        (column, row): order[start:end]
+        for (column, row), start, end in zip(used_cells.tolist(), starts, starts + counts)
+    }
+
+    # the windows near the sites: the middle of an edge can be in a window without sites
+    nb_neighbours = int(np.ceil(overlap / window_size))
+    offsets = list(product(range(-nb_neighbours, nb_neighbours + 1), repeat=2))
+    windows = np.unique((used_cells[:, np.newaxis, :] + np.array(offsets)).reshape(-1, 2), axis=0)
+
+    voronoi_windows = []
+    for column, row in windows.tolist():
+        neighbour_buckets = [
+            buckets[(column + column_offset, row + row_offset)]
+            for column_offset, row_offset in offsets
+            if (column + column_offset, row + row_offset) in buckets
+        ]
+        neighbour_sites = sites[np.concatenate(neighbour_buckets)]
+        xmin, ymin = origin + np.array([column, row]) * window_size
+        xmax, ymax = xmin + window_size, ymin + window_size
+        in_extended_window = (
+            (neighbour_sites[:, 0] >= xmin - overlap)
+            & (neighbour_sites[:, 0] <= xmax + overlap)
+            & (neighbour_sites[:, 1] >= ymin - overlap)
+            & (neighbour_sites[:, 1] <= ymax + overlap)
+        )
+        if np.count_nonzero(in_extended_window) >= 2:
+            voronoi_windows.append((neighbour_sites[in_extended_window], (xmin, ymin, xmax, ymax)))
+    return voronoi_windows
+
+
+def create_tiled_voronoi_edges(sites: np.ndarray, window_size: float, overlap: float, num_workers: int = 1) -> List:
+    """
+    Returns the edges of the voronoi diagram of the sites, computed by overlapping windows, so that the cost of
+    each diagram is bounded by the size of the windows (and the windows can be computed on a process pool)
+    Args:
+        - sites (np.ndarray): (N, 2) coordinates of the sites
+        - window_size (float): size of the windows
+        - overlap (float): size of the margin around each window (should be bigger than the width of the river)
+        - num_workers (int): number of processes (1: the windows are computed one after another)
+    """
+    # each window gets only the sites of its extended window
+    args = [
+        (window_sites, window, overlap) for window_sites, window in get_voronoi_windows(sites, window_size, overlap)
+    ]
+
+    if num_workers is None or num_workers <= 1:
+        edges_list = [get_voronoi_edges_in_window(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            edges_list = list(executor.map(_get_voronoi_edges_in_window_args, args))
+    return [edge for edges in edges_list for edge in edges]
+
+
+def cut_lines(lines: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    """
+    Cuts lines at a distance from their starting point, all at once. The minimum length left is 1
+    Args:
+        - lines (np.ndarray): the lines to cut
+        - distances (np.ndarray): the distance to cut from the start of each line
+    """
+    lines = np.asarray(lines, dtype=object)
+    if len(lines) == 0:
+        return lines
     # limit the distance cut so we are left with 1m at least
-    distance = max(0, min(line.length - 1, distance))  # max(0,...) to garanty a positive distance
-
-    # reverse the distance and the coords so we don't measure the distance cut but the
-    # distance kept to avoid dragging "reverse" and -index
-    distance = line.length - distance
-    coords = list(reversed(line.coords))
-
-    previous_point = coords[0]
-    for index, point in enumerate(coords[1:]):
-        segment = LineString([previous_point, point])
-        if distance > segment.length:
-            distance = distance - segment.length
-            previous_point = point
-            continue
-        elif distance == segment.length:
-            return LineString(reversed(coords[: 2 + index]))  # reversed to put the line back in the correct order
-        else:  # distance < segment.length
-            cutting_point = segment.interpolate(distance)
-            return LineString(reversed(coords[: index + 1] + [(cutting_point.x, cutting_point.y)]))
+    distances = np.maximum(0, np.minimum(shapely.length(lines) - 1, distances))  # max(0,...) to garanty a positive
+
+    coords, line_indexes = shapely.get_coordinates(lines, return_index=True)
+    starts = np.searchsorted(line_indexes, np.arange(len(lines)))
+
+    # cumulative length along the lines (the "segments" between 2 lines have a length of 0)
+    segment_lengths = np.hypot(*np.diff(coords, axis=0).T)
+    segment_lengths[line_indexes[1:] != line_indexes[:-1]] = 0
+    cumulative_lengths = np.concatenate(([0], np.cumsum(segment_lengths)))
+
+    # the cutting point of each line is on the segment [index - 1, index]
+    cutting_lengths = cumulative_lengths[starts] + distances
+    indexes = np.searchsorted(cumulative_lengths, cutting_lengths, side="right")
+    indexes = np.clip(indexes, starts + 1, np.append(starts[1:], len(coords)) - 1)
+    ratios = (cutting_lengths - cumulative_lengths[indexes - 1]) / np.maximum(segment_lengths[indexes - 1], 1e-300)
+    cutting_points = coords[indexes - 1] + ratios[:, np.newaxis] * (coords[indexes] - coords[indexes - 1])
+
+    # if the cutting point is a vertex, it's kept instead of the interpolated point
+    is_on_vertex = ratios <= 0
+    cutting_points[is_on_vertex] = coords[indexes - 1][is_on_vertex]
+
+    # new lines: the cutting point, then the vertices after it
+    is_kept = np.arange(len(coords)) >= indexes[line_indexes]
+    new_coords = np.concatenate((cutting_points, coords[is_kept]))
+    new_line_indexes = np.concatenate((np.arange(len(lines)), line_indexes[is_kept]))
+    order = np.argsort(new_line_indexes, kind="stable")
+    return shapely.linestrings(new_coords[order], indices=new_line_indexes[order])
+
+
+def cut_lines_both_ends(lines: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    """
+    Cuts lines at a distance from both their extremities, all at once (the lines are reversed).
+    The minimum length left is 1
+    Args:
+        - lines (np.ndarray): the lines to cut
+        - distances (np.ndarray): the distance to cut from each extremity of each line
+    """
+    lines = np.asarray(lines, dtype=object)
+    if len(lines) == 0:
+        return lines
+    # max(0,...) to garanty a positive distance
+    half_distances = np.maximum(0, np.minimum(shapely.length(lines) - 1, np.asarray(distances) * 2) / 2)
+    half_lines = cut_lines(lines, half_distances)
+    return cut_lines(shapely.reverse(half_lines), half_distances)
+
+
+def cut(line: LineString, distance: float) -> LineString:
+    """Cuts a line at a distance from its starting point. The minimum length left is 1"""
+    return cut_lines(np.array([line], dtype=object), np.array([distance]))[0]
 
 
 def cut_both_ends(line: LineString, distance: float) -> LineString:
-    half_distance = max(0, min(line.length - 1, distance * 2) / 2)  # max(0,...) to garanty a positive distance
-    half_line = cut(line, half_distance)
-    return cut(LineString(reversed(half_line.coords)), half_distance)
+    """Cuts a line at a distance from both its extremities (the line is reversed). The minimum length left is 1"""
+    return cut_lines_both_ends(np.array([line], dtype=object), np.array([distance]))[0]
 
 
 def get_df_points_from_gdf(gdf: GeoDataFrame) -> pd.DataFrame:
@@ -354,54 +441,44 @@ def get_df_points_from_gdf(gdf: GeoDataFrame) -> pd.DataFrame:
     -Args :
         - gdf (GeoDataFrame) : the geodataframe we want the points' coordinates from
     """
-
-    all_points = set()  # we use a set instead of a list to remove doubles
-    for _, row in gdf.iterrows():
-        unknown_geometry = row["geometry"]
-        if isinstance(unknown_geometry, Polygon):
-            line: MultiLineString = unknown_geometry.exterior
-        elif isinstance(unknown_geometry, MultiLineString):
-            line: MultiLineString = unknown_geometry
-        elif isinstance(unknown_geometry, LineString):
-            line: LineString = unknown_geometry
-        else:
-            raise NotImplementedError("Type unknown")
-        for coord in line.coords:
-            all_points.add(coord)
-
-    all_points = list(all_points)
-    return pd.DataFrame(
-        data={
-            "x": [point[0] for point in all_points],
-            "y": [point[1] for point in all_points],
-        }
-    )
-
-
-def get_vertices_dict(gdf_lines: GeoDataFrame) -> Dict[Point, List[LineString]]:
+    geometries = np.asarray(gdf["geometry"].values, dtype=object)
+    geometry_types = shapely.get_type_id(geometries)
+    known_types = [
+        shapely.GeometryType.POLYGON,
+        shapely.GeometryType.MULTILINESTRING,
+        shapely.GeometryType.LINESTRING,
+        shapely.GeometryType.LINEARRING,
+    ]
+    if not np.isin(geometry_types, known_types).all():
+        raise NotImplementedError("Type unknown")
+
+    # only the exterior of the polygons
+    is_polygon = geometry_types == shapely.GeometryType.POLYGON
+    geometries = np.where(is_polygon, shapely.get_exterior_ring(geometries), geometries)
+
+    # remove doubles (np.unique on the rows compares the coordinates as floats, like a set of tuples)
+    all_points = np.unique(shapely.get_coordinates(geometries), axis=0)
+    return pd.DataFrame(data={"x": all_points[:, 0], "y": all_points[:, 1]})
+
+
+def get_vertices_positions_dict(gdf_lines: GeoDataFrame) -> Dict[Point, List[int]]:
     """
-    get a dictionary of vertices listing all the lines having a specific vertex as one of its extremities
+    get a dictionary of vertices listing the positions (in gdf_lines) of all the lines having a specific vertex
+    as one of its extremities
     Args:
         - gdf_lines:geodataframe containing a list of lines
     return:
-        - a dict with the vertices are the keys and the values are lists of lines
+        - a dict with the vertices are the keys and the values are lists of positions of lines
     """
     #  prepare a vertice dict, containing all the lines connected on a same vertex
     vertices_dict = {}
-    for index in gdf_lines.index:
-        line = gdf_lines.iloc[index]["geometry"]
+    for position, line in enumerate(gdf_lines["geometry"].values):
         if line.is_ring:  # it's a loop : no extremity
             continue
 
         point_a, point_b = line.boundary.geoms[0], line.boundary.geoms[1]
-        try:
-            vertices_dict[point_a].append(line)
-        except KeyError:
-            vertices_dict[point_a] = [line]
-        try:
-            vertices_dict[point_b].append(line)
-        except KeyError:
-            vertices_dict[point_b] = [line]
+        vertices_dict.setdefault(point_a, []).append(position)
+        vertices_dict.setdefault(point_b, []).append(position)
     return vertices_dict
 
 
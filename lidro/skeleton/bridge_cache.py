@@ -0,0 +1,144 @@
+""" Local cache of the bridges of DB_Uni, to check the gap candidates without querying the database
+"""
+
+import json
+import os
+from typing import List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import psycopg
+import shapely
+from pyproj.crs.crs import CRS
+from shapely import STRtree
+
+BRIDGES_TABLES = ["Construction_lineaire", "Construction_surfacique"]
+
+
+def query_db_for_bridges_in_bbox(
+    bbox: Tuple[float, float, float, float], db_conn: psycopg.Connection
+) -> gpd.GeoDataFrame:
+    """
+    Query the database for all the bridges (linear and surface) intersecting a bounding box
+    args:
+        - bbox (Tuple[float, float, float, float]): xmin, ymin, xmax, ymax of the area
+        - db_conn (psycopg.Connection): an open connection to the database
+    returns:
+        - a geodataframe with the 2D geometry of the bridges and the table they come from
+    """
+    geometries, tables = [], []
+    with db_conn.cursor() as db_cursor:
+        for table in BRIDGES_TABLES:
+            db_cursor.execute(
+                f"SELECT ST_AsBinary(ST_Force2D(geometrie)) FROM public.{table} "
+                "WHERE gcms_detruit = false "
+                "AND nature = 'Pont' "
+                "AND ST_Intersects(ST_Force2D(geometrie), ST_MakeEnvelope(%s, %s, %s, %s));",
+                [float(coordinate) for coordinate in bbox],
+            )
+            rows = db_cursor.fetchall()
+            geometries += [bytes(row[0]) for row in rows]
+            tables += [table] * len(rows)
+    return gpd.GeoDataFrame({"table": tables}, geometry=shapely.from_wkb(geometries))
+
+
+def get_bridges_bbox_path(bridges_path: str) -> str:
+    """
+    Return the path of the file storing the bounding box exported with the bridges (next to the bridges)
+    args:
+        - bridges_path (str): path to the local file of the bridges
+    """
+    return f"{bridges_path}.bbox.json"
+
+
+def write_bridges(gdf_bridges: gpd.GeoDataFrame, bbox: Tuple[float, float, float, float], output_path: str):
+    """
+    Write the bridges into a local file, and the bounding box they were exported for into a file next to it
+    (see get_bridges_bbox_path), to know later which area the local file covers
+    args:
+        - gdf_bridges (gpd.GeoDataFrame): the bridges
+        - bbox (Tuple[float, float, float, float]): xmin, ymin, xmax, ymax of the area of the bridges
+        - output_path (str): path to the local file (its driver is deduced from its extension)
+    """
+    gdf_bridges.to_file(output_path)
+    with open(get_bridges_bbox_path(output_path), "w") as file:
+        json.dump({"bbox": [float(coordinate) for coordinate in bbox]}, file)
+
+
+def export_bridges(bbox: Tuple[float, float, float, float], output_path: str, crs: CRS, db_conn: psycopg.Connection):
+    """
+    Export the bridges of DB_Uni intersecting a bounding box (the block) into a local file,
+    to be used later without access to the database (see skeleton.db_uni.bridges_cache_path)
+    args:
+        - bbox (Tuple[float, float, float, float]): xmin, ymin, xmax, ymax of the block
+        - output_path (str): path to the local file (its driver is deduced from its extension)
+        - crs (CRS): the crs of the bridges
+        - db_conn (psycopg.Connection): an open connection to the database
+    """
+    gdf_bridges = query_db_for_bridges_in_bbox(bbox, db_conn)
+    write_bridges(gdf_bridges.set_crs(crs, allow_override=True), bbox, output_path)
+
+
+def read_bridges_bbox(bridges_path: str) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Read the bounding box the local file of the bridges was exported for (None if it is unknown)
+    args:
+        - bridges_path (str): path to the local file of the bridges (see export_bridges)
+    """
+    bbox_path = get_bridges_bbox_path(bridges_path)
+    if not os.path.isfile(bridges_path) or not os.path.isfile(bbox_path):
+        return None
+    with open(bbox_path, "r") as file:
+        return tuple(json.load(file)["bbox"])
+
+
+def are_bridges_covering(bbox: Tuple[float, float, float, float], bridges_path: str) -> bool:
+    """
+    Return True if the local file of the bridges exists and was exported for an area containing bbox
+    args:
+        - bbox (Tuple[float, float, float, float]): xmin, ymin, xmax, ymax of the area to check
+        - bridges_path (str): path to the local file of the bridges (see export_bridges)
+    """
+    return is_bbox_covered(bbox, read_bridges_bbox(bridges_path))
+
+
+def is_bbox_covered(
+    bbox: Tuple[float, float, float, float], bridges_bbox: Optional[Tuple[float, float, float, float]]
+) -> bool:
+    """
+    Return True if the bounding box the bridges were exported for (see read_bridges_bbox) contains bbox
+    args:
+        - bbox (Tuple[float, float, float, float]): xmin, ymin, xmax, ymax of the area to check
+        - bridges_bbox (Tuple[float, float, float, float]): bounding box of the bridges (None if it is unknown)
+    """
+    if bridges_bbox is None:
+        return False
+    xmin, ymin, xmax, ymax = bbox
+    return bridges_bbox[0] <= xmin and bridges_bbox[1] <= ymin and xmax <= bridges_bbox[2] and ymax <= bridges_bbox[3]
+
+
+def read_bridges(bridges_path: str) -> STRtree:
+    """
+    Read the local file of the bridges, and return a spatial index of their geometries
+    args:
+        - bridges_path (str): path to the local file of the bridges (see export_bridges)
+    """
+    gdf_bridges = gpd.read_file(bridges_path)
+    return STRtree(np.asarray(gdf_bridges.geometry.values, dtype=object))
+
+
+def query_bridges_across_lines(lines: List[str], bridges_tree: STRtree) -> List[bool]:
+    """
+    Check with the local bridges if lines intersect a bridge
+    args:
+        - lines (List[str]): the lines (as WKT) we want to check if they cross a bridge
+        - bridges_tree (STRtree): spatial index of the bridges (see read_bridges)
+    returns:
+        - for each line, True if it crosses a bridge
+    """
+    is_bridge = np.zeros(len(lines), dtype=bool)
+    if len(lines) == 0:
+        return []
+    indexes_with_bridge, _ = bridges_tree.query(shapely.from_wkt(lines), predicate="intersects")
+    is_bridge[indexes_with_bridge] = True
+    return is_bridge.tolist()
@@ -1,14 +1,24 @@
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple
 
 import geopandas as gpd
+import numpy as np
 import psycopg
+import shapely
 from geopandas.geodataframe import GeoDataFrame
 from omegaconf import DictConfig
 from pyproj.crs.crs import CRS
-from shapely import make_valid
+from shapely import STRtree, make_valid
 
 from lidro.skeleton.branch import Branch, Candidate
+from lidro.skeleton.bridge_cache import (
+    is_bbox_covered,
+    query_bridges_across_lines,
+    read_bridges,
+    read_bridges_bbox,
+)
 from lidro.skeleton.group_maker import GroupMaker
 
 sys.path.append("../lidro")
@@ -29,50 +39,163 @@ def db_connector(config: DictConfig):
     )
 
 
-def query_db_for_bridge_across_gap(config: DictConfig, candidate: Candidate) -> bool:
+def get_reduced_gap_line(candidate: Candidate, ratio_gap: float) -> str:
     """
-    Query the database to check if a candidate to close a gap between 2 branches intersects a bridge
+    Return the segment (as WKT) that is checked to see if a candidate intersects a bridge:
+    the line between the 2 extremities, reduced by a ratio (if too long, the line can intersect
+    bridges from another area)
     args:
-        - config (DictConfig): the config dict from hydra
         - candidate (Candidate): the candidate we want to check if it crosses a bridge
+        - ratio_gap (float): ratio of the line to keep
     """
-    # creation of the segment that will be checked to see if it intersects a bridge
-    # that segment is the line between the 2 extremities, reduced by a ratio ( if too long, the line can intesects
-    # bridge from another area)
     middle_x = (candidate.extremity_1[0] + candidate.extremity_2[0]) / 2
     middle_y = (candidate.extremity_1[1] + candidate.extremity_2[1]) / 2
-    new_ext_1_x = (candidate.extremity_1[0] - middle_x) * config.skeleton.ratio_gap + middle_x
-    new_ext_1_y = (candidate.extremity_1[1] - middle_y) * config.skeleton.ratio_gap + middle_y
-    new_ext_2_x = (candidate.extremity_2[0] - middle_x) * config.skeleton.ratio_gap + middle_x
-    new_ext_2_y = (candidate.extremity_2[1] - middle_y) * config.skeleton.ratio_gap + middle_y
-
-    # creation of queries
-    line = f"LINESTRING({new_ext_1_x} {new_ext_1_y}, {new_ext_2_x} {new_ext_2_y})"
-    query_linear = (
-        "SELECT cleabs FROM public.Construction_lineaire "
-        "WHERE gcms_detruit = false "
-        "AND nature = 'Pont' "
-        f"AND ST_Intersects(ST_Force2D(geometrie), ST_GeomFromText('{line}'));"
-    )
-    query_area = (
-        "SELECT cleabs FROM public.Construction_surfacique "
-        "WHERE gcms_detruit = false "
-        "AND nature = 'Pont' "
-        f"AND ST_Intersects(ST_Force2D(geometrie), ST_GeomFromText('{line}'));"
+    new_ext_1_x = (candidate.extremity_1[0] - middle_x) * ratio_gap + middle_x
+    new_ext_1_y = (candidate.extremity_1[1] - middle_y) * ratio_gap + middle_y
+    new_ext_2_x = (candidate.extremity_2[0] - middle_x) * ratio_gap + middle_x
+    new_ext_2_y = (candidate.extremity_2[1] - middle_y) * ratio_gap + middle_y
+    return f"LINESTRING({new_ext_1_x} {new_ext_1_y}, {new_ext_2_x} {new_ext_2_y})"
+
+
+# all the segments are sent at once as an array, and joined with the bridges of both tables
+QUERY_BRIDGES_ACROSS_GAPS = """
+    SELECT segment.index
+    FROM unnest(%(indexes)s::integer[], %(lines)s::text[]) AS segment(index, line)
+    WHERE EXISTS (
+        SELECT 1 FROM public.Construction_lineaire
+        WHERE gcms_detruit = false
+        AND nature = 'Pont'
+        AND ST_Intersects(ST_Force2D(geometrie), ST_GeomFromText(segment.line))
     )
+    OR EXISTS (
+        SELECT 1 FROM public.Construction_surfacique
+        WHERE gcms_detruit = false
+        AND nature = 'Pont'
+        AND ST_Intersects(ST_Force2D(geometrie), ST_GeomFromText(segment.line))
+    );
+"""
+
+
+def query_db_for_bridges_across_gaps(
+    config: DictConfig, candidates: List[Candidate], db_conn: psycopg.Connection
+) -> List[bool]:
+    """
+    Query the database (in a single query) to check if candidates to close gaps between branches intersect a bridge
+    args:
+        - config (DictConfig): the config dict from hydra
+        - candidates (List[Candidate]): the candidates we want to check if they cross a bridge
+        - db_conn (psycopg.Connection): an open connection to the database (see db_connector)
+    returns:
+        - for each candidate, True if it crosses a bridge
+    """
+    if not candidates:
+        return []
 
-    # execution of queries
+    lines = [get_reduced_gap_line(candidate, config.skeleton.ratio_gap) for candidate in candidates]
+    with db_conn.cursor() as db_cursor:
+        db_cursor.execute(QUERY_BRIDGES_ACROSS_GAPS, {"indexes": list(range(len(lines))), "lines": lines})
+        indexes_with_bridge = {row[0] for row in db_cursor.fetchall()}
+    return [index in indexes_with_bridge for index in range(len(candidates))]
+
+
+def query_db_for_bridge_across_gap(config: DictConfig, candidate: Candidate) -> bool:
+    """
+    Query the database to check if a candidate to close a gap between 2 branches intersects a bridge
+    args:
+        - config (DictConfig): the config dict from hydra
+        - candidate (Candidate): the candidate we want to check if it crosses a bridge
+    """
     with db_connector(config) as db_conn:
-        with db_conn.cursor() as db_cursor:
-            whole_query = query_linear + query_area
-            db_cursor.execute(whole_query)
+        return query_db_for_bridges_across_gaps(config, [candidate], db_conn)[0]
+
+
+class BridgesChecker:
+    """
+    Check if candidates to close gaps between branches intersect a bridge: with the local file of
+    the bridges if skeleton.db_uni.bridges_cache_path is set, otherwise with queries to the database.
+    The file and its bounding box are read (or the connection to the database is opened) once, when
+    entering the context, and kept for all the checks
+    """
+
+    def __init__(self, config: DictConfig):
+        """
+        args:
+            - config (DictConfig): the config dict from hydra
+        """
+        self.config = config
+        self.bridges_cache_path = config.skeleton.db_uni.bridges_cache_path
+        self.bridges_tree = None
+        self.bridges_bbox = None
+        self.db_conn = None
+
+    def __enter__(self):
+        if self.bridges_cache_path:
+            if not os.path.isfile(self.bridges_cache_path):
+                raise FileNotFoundError(f"The file of the bridges ({self.bridges_cache_path}) doesn't exist.")
+            self.bridges_bbox = read_bridges_bbox(self.bridges_cache_path)
+            self.bridges_tree = read_bridges(self.bridges_cache_path)
+        else:
+            self.db_conn = db_connector(self.config)
+        return self
+
+    def __exit__(self, *args):
+        if self.db_conn is not None:
+            self.db_conn.close()
+            self.db_conn = None
+
+    def check(self, candidates: List[Candidate]) -> List[bool]:
+        """
+        Check candidates (in a single query to the database)
+        args:
+            - candidates (List[Candidate]): the candidates we want to check if they cross a bridge
+        returns:
+            - for each candidate, True if it crosses a bridge
+        """
+        if not candidates:
+            return []
+
+        if not self.bridges_cache_path:
+            return query_db_for_bridges_across_gaps(self.config, candidates, self.db_conn)
+
+        lines = [get_reduced_gap_line(candidate, self.config.skeleton.ratio_gap) for candidate in candidates]
+        # a local file exported for another (or a smaller) area would silently miss bridges
+        lines_bbox = shapely.total_bounds(shapely.from_wkt(lines))
+        if not is_bbox_covered(lines_bbox, self.bridges_bbox):
+            raise ValueError(
+                f"The file of the bridges ({self.bridges_cache_path}) was not exported for an area containing the "
+                f"gaps {tuple(lines_bbox)}: it should be exported again (see export_bridges)."
+            )
+        return query_bridges_across_lines(lines, self.bridges_tree)
 
-            result_linear = db_cursor.fetchone()
-            db_cursor.nextset()
-            result_area = db_cursor.fetchone()
-            if result_linear or result_area:
-                return True
-            return False
+
+def check_bridges_across_gaps(config: DictConfig, candidates: List[Candidate]) -> List[bool]:
+    """
+    Check if candidates to close gaps between branches intersect a bridge (see BridgesChecker)
+    args:
+        - config (DictConfig): the config dict from hydra
+        - candidates (List[Candidate]): the candidates we want to check if they cross a bridge
+    returns:
+        - for each candidate, True if it crosses a bridge
+    """
+    if not candidates:
+        return []
+
+    with BridgesChecker(config) as bridges_checker:
+        return bridges_checker.check(candidates)
+
+
+def needs_bridge_check(config: DictConfig, candidate: Candidate) -> bool:
+    """
+    Return True if the gap is wide enough to check with DB_Uni if there is a bridge (and if we want to interrogate
+    the DB). If it's small enough, the candidate is automatically validated
+    args:
+        - config (DictConfig): the config dict from hydra
+        - candidate (Candidate): the candidate to check
+    """
+    return (
+        config.skeleton.db_uni.db_using_db
+        and candidate.squared_distance > config.skeleton.gap_width_check_db * config.skeleton.gap_width_check_db
+    )
 
 
 def select_candidates(
@@ -100,17 +223,29 @@ def select_candidates(
     # C cannot be connected to A
     branch_group = GroupMaker(list(branch_set))
 
+    # get all possible candidates between the branches of each pair (a query on a KD-tree for each pair), and
+    # check all the candidates that need it with DB_Uni at once (a single query, or the local bridges read once)
+    candidates_list = [branch_a.get_candidates(branch_b) for branch_a, branch_b, _ in branches_pair_list]
+    candidates_to_check = [
+        candidate
+        for candidates in candidates_list
+        for candidate in candidates
+        if needs_bridge_check(config, candidate)
+    ]
+    is_bridge_list = check_bridges_across_gaps(config, candidates_to_check)
+    candidates_with_bridge = {
+        id(candidate) for candidate, is_bridge in zip(candidates_to_check, is_bridge_list) if is_bridge
+    }
+
     validated_candidates = []
     extremities_connected = set()
-    for branch_a, branch_b, _ in branches_pair_list:
+    for (branch_a, branch_b, _), candidates in zip(branches_pair_list, candidates_list):
         branch_a: Branch
 
         # we don't create link between 2 branches already connected
         if branch_group.are_together(branch_a, branch_b):
             continue
 
-        candidates = branch_a.get_candidates(branch_b)  # get all possible candidates between A abd B
-
         # test each candidate to see if we can draw a line between its branches
         nb_bridges_crossed = 0
         for candidate in candidates:
@@ -119,18 +254,9 @@ def select_candidates(
             if candidate.extremity_1 in extremities_connected or candidate.extremity_2 in extremities_connected:
                 continue
 
-            # if the gap is wide enough, we check with DB_Uni to see if there is a bridge
-            # On the other hand, if it's small enough the candidate is automatically validated
-            # All that, ONLy if we want to interrogate the DB
-            if (
-                config.skeleton.db_uni.db_using_db
-                and candidate.squared_distance
-                > config.skeleton.gap_width_check_db * config.skeleton.gap_width_check_db
-            ):
-                is_bridge = query_db_for_bridge_across_gap(config, candidate)
-                # if the line does not cross any bridge, we don't validate that candidate
-                if not is_bridge:
-                    continue
+            # if the gap is wide enough, the candidate is validated only if it crosses a bridge (from DB_Uni)
+            if needs_bridge_check(config, candidate) and id(candidate) not in candidates_with_bridge:
+                continue
 
             # candidate validated
             extremities_connected.add(candidate.extremity_1)
@@ -189,13 +315,59 @@ def create_branches_pair(config: DictConfig, branches_list: List[Branch]) -> Lis
     for the water to flow anyway between them
     Args:
         - config (DictConfig): the config dict from hydra
+        - branches_list (List[Branch]): the branches to pair
     """
 
+    if len(branches_list) < 2:
+        return []
+
+    # find the pairs of masks closer than max_gap_width with a spatial index, instead of
+    # computing the distance between all the pairs of branches
+    masks = np.array([branch.gdf_branch_mask.geometry[0] for branch in branches_list], dtype=object)
+    tree = STRtree(masks)
+    indexes_a, indexes_b = tree.query(masks, predicate="dwithin", distance=config.skeleton.max_gap_width)
+
+    # each pair only once (in the order of branches_list), at a distance strictly smaller than max_gap_width
+    is_pair = indexes_a < indexes_b
+    indexes_a, indexes_b = indexes_a[is_pair], indexes_b[is_pair]
+    distances = shapely.distance(masks[indexes_a], masks[indexes_b])
+    is_close = distances < config.skeleton.max_gap_width
+    indexes_a, indexes_b, distances = indexes_a[is_close], indexes_b[is_close], distances[is_close]
+    order = np.lexsort((indexes_b, indexes_a))
+
     # create branches_pair_list, that stores all pairs of branches close enough to have a bridge
-    branches_pair_list = []
-    for index, branch_a in enumerate(branches_list[:-1]):
-        for branch_b in branches_list[index + 1 :]:  # noqa E203
-            distance = branch_a.distance_to_a_branch(branch_b)
-            if distance < config.skeleton.max_gap_width:
-                branches_pair_list.append((branch_a, branch_b, distance))
-    return branches_pair_list
+    return [
+        (branches_list[index_a], branches_list[index_b], distance)
+        for index_a, index_b, distance in zip(indexes_a[order], indexes_b[order], distances[order])
+    ]
+
+
+def compute_branch_skeleton(branch: Branch) -> GeoDataFrame:
+    """
+    create, simplify and shorten the skeleton of a branch (its gap points must be set), and return its lines
+    Args:
+        - branch (Branch): the branch
+    """
+    branch.create_skeleton()
+    branch.simplify()
+    branch.shorten_lines()
+    return branch.gdf_skeleton_lines
+
+
+def create_branches_skeleton(branches_list: List[Branch], num_workers: int = 1):
+    """
+    create the skeleton of each branch (the skeleton of each branch is independent from the others
+    once the gap points are set), on a process pool if num_workers > 1
+    Args:
+        - branches_list (List[Branch]): the branches
+        - num_workers (int): number of processes (1: the branches are processed one after another)
+    """
+    if num_workers is None or num_workers <= 1 or len(branches_list) <= 1:
+        for branch in branches_list:
+            compute_branch_skeleton(branch)
+        return
+
+    # each branch (with its mask and gap points) is sent to a worker, and its skeleton lines are sent back
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for branch, gdf_skeleton_lines in zip(branches_list, executor.map(compute_branch_skeleton, branches_list)):
+            branch.gdf_skeleton_lines = gdf_skeleton_lines
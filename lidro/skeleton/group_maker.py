@@ -7,25 +7,37 @@ class GroupMaker:
     put_together(A, B) -> {A, B}, {C}, {D}, {E}
     put_together(C, D) -> {A, B}, {C, D}, {E}
     put_together(A, D) -> {A, B, C, D}, {E}
+
+    The groups are stored as a disjoint-set forest (union-find, with path compression and union by rank),
+    so both operations take an almost constant time, whatever the number of groups
     """
     def __init__(self, element_list):
-        self.element_set_list = [{element} for element in element_list]
+        self.parent = {element: element for element in element_list}
+        self.rank = {element: 0 for element in element_list}
 
-    def find_index(self, element) -> int:
-        for index, element_set in enumerate(self.element_set_list):
-            if element in element_set:
-                return index
+    def find(self, element):
+        """return the representative element of the group of an element"""
+        root = element
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # path compression: all the elements on the path now point directly to the root
+        while self.parent[element] != root:
+            self.parent[element], element = root, self.parent[element]
+        return root
 
     def are_together(self, element_a, element_b) -> bool:
         """return true if 2 elements are already together"""
-        index = self.find_index(element_a)
-        return element_b in self.element_set_list[index]
+        return self.find(element_a) == self.find(element_b)
 
     def put_together(self, element_a, element_b):
         """put the set of a and b together if they aren't"""
-        if self.are_together(element_a, element_b):
+        root_a = self.find(element_a)
+        root_b = self.find(element_b)
+        if root_a == root_b:
             return
-        index_a = self.find_index(element_a)
-        set_a = self.element_set_list.pop(index_a)
-        index_b = self.find_index(element_b)
-        self.element_set_list[index_b] = self.element_set_list[index_b].union(set_a)
+        # union by rank: the smaller tree is attached under the root of the bigger one
+        if self.rank[root_a] < self.rank[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        if self.rank[root_a] == self.rank[root_b]:
+            self.rank[root_a] += 1
@@ -0,0 +1,237 @@
+""" Skeleton held as a graph of integer nodes, to simplify it without handling a geometry for each line
+"""
+
+from itertools import product
+from typing import List, Tuple
+
+import numpy as np
+import shapely
+from shapely import LineString, Point
+
+
+class SkeletonGraph:
+    """
+    A skeleton as a graph: the nodes are the extremities of the lines (identified by an integer, their
+    coordinates are in node_coords), the edges are the lines between 2 nodes (edge_nodes, with their
+    length and their coordinates).
+    The edges connected to each node are given by an adjacency in CSR format (see get_adjacency), so
+    the lines can be removed and merged with arrays only, and the geometries are built once at the end
+    """
+
+    def __init__(self, lines: List[LineString]):
+        """
+        Args:
+            - lines (List[LineString]): the lines of the skeleton
+        """
+        coords, line_indexes = shapely.get_coordinates(np.asarray(lines, dtype=object), return_index=True)
+        starts = np.searchsorted(line_indexes, np.arange(len(lines)))
+        ends = np.searchsorted(line_indexes, np.arange(len(lines)), side="right")
+        is_line = ends - starts >= 2  # empty lines are ignored
+        starts, ends = starts[is_line], ends[is_line]
+
+        # the nodes are the unique extremities of the lines
+        extremities = np.concatenate((coords[starts], coords[ends - 1]))
+        self.node_coords, node_indexes = np.unique(extremities, axis=0, return_inverse=True)
+        self.edge_nodes = node_indexes.reshape(2, -1).T
+        self.edge_coords = [coords[start:end] for start, end in zip(starts, ends)]
+        self.edge_lengths = shapely.length(np.asarray(lines, dtype=object)[is_line])
+
+    @property
+    def nb_edges(self) -> int:
+        return len(self.edge_nodes)
+
+    def get_adjacency(self, edges_mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the adjacency of the nodes in CSR format: the edges connected to node i (among the edges
+        of edges_mask) are edges[indptr[i]:indptr[i + 1]], in the order of the edges. An edge with both
+        extremities on the same node is listed twice
+        Args:
+            - edges_mask (np.ndarray): boolean array, the edges to take into account
+        """
+        edge_indexes = np.flatnonzero(edges_mask)
+        nodes = self.edge_nodes[edge_indexes].ravel()
+        order = np.argsort(nodes, kind="stable")
+        indptr = np.zeros(len(self.node_coords) + 1, dtype=int)
+        indptr[1:] = np.cumsum(np.bincount(nodes, minlength=len(self.node_coords)))
+        return indptr, np.repeat(edge_indexes, 2)[order]
+
+    def get_gap_nodes(self, gap_points: List[Point]) -> np.ndarray:
+        """
+        Returns a boolean array, True for the nodes used to close a gap
+        Args:
+            - gap_points (List[Point]): the points used to close gaps
+        """
+        is_gap_node = np.zeros(len(self.node_coords), dtype=bool)
+        for gap_point in gap_points:
+            is_gap_node |= (self.node_coords[:, 0] == gap_point.x) & (self.node_coords[:, 1] == gap_point.y)
+        return is_gap_node
+
+    def get_extra_edges(self, water_min_size: float, gap_points: List[Point]) -> np.ndarray:
+        """
+        Returns a boolean array, True for the 'spikes' (the lone lines going outward) to remove from the skeleton.
+        Keeps the extremities of long enough lines, and the lines toward the points used to close gaps
+        Args:
+            - water_min_size (float): the lines longer than that are always kept
+            - gap_points (List[Point]): the points used to close gaps
+        """
+        # a loop has no extremity: it is not taken into account
+        is_loop = self.edge_nodes[:, 0] == self.edge_nodes[:, 1]
+        indptr, edges = self.get_adjacency(~is_loop)
+        degrees = np.diff(indptr)
+        is_gap_node = self.get_gap_nodes(gap_points)
+
+        # a line can be removed if it is short, if its extremities are not used to close a gap,
+        # and if it isn't connected to other lines on both extremities
+        node_a, node_b = self.edge_nodes[:, 0], self.edge_nodes[:, 1]
+        can_be_removed = (
+            ~is_loop
+            & (self.edge_lengths <= water_min_size)
+            & ~is_gap_node[node_a]
+            & ~is_gap_node[node_b]
+            & ~((degrees[node_a] > 1) & (degrees[node_b] > 1))
+        )
+
+        # number of lines that can be removed on each node (with more than 1 line)
+        nodes = np.repeat(np.arange(len(self.node_coords)), degrees)
+        nb_can_be_removed = np.bincount(nodes, weights=can_be_removed[edges], minlength=len(self.node_coords))
+        nb_can_be_removed[degrees <= 1] = 0
+
+        # there is only 1 line that can be removed on a node, so we remove it
+        is_extra = np.zeros(self.nb_edges, dtype=bool)
+        is_single = (nb_can_be_removed[nodes] == 1) & can_be_removed[edges]
+        is_extra[edges[is_single]] = True
+
+        # at least 2 lines can be removed on a node, we will keep the one forming the straightest line with
+        # a line to keep, we assume it's the most likely to "continue" the river
+        for node in np.flatnonzero(nb_can_be_removed >= 2):
+            start, end = indptr[node], indptr[node + 1]
+            node_edges = edges[start:end]
+            edges_to_keep = list(node_edges[~can_be_removed[node_edges]])
+            edges_that_can_be_removed = list(node_edges[can_be_removed[node_edges]])
+
+            # strange case where 3+ lines are together, but isolated from the rest of the world
+            # we decide to keep the longuest line
+            if not edges_to_keep:
+                longest_edge = max(edges_that_can_be_removed, key=lambda edge: self.edge_lengths[edge])
+                edges_that_can_be_removed.remove(longest_edge)
+                edges_to_keep.append(longest_edge)
+
+            #  the smallest dot product (which should be negative) is the straightest couple of lines
+            min_dot_product = np.inf
+            edge_that_should_not_be_removed = edges_that_can_be_removed[0]
+            for edge_to_keep, edge_that_can_be_removed in product(edges_to_keep, edges_that_can_be_removed):
+                vector_to_keep = self.get_unit_vector(node, edge_to_keep)
+                vector_to_remove = self.get_unit_vector(node, edge_that_can_be_removed)
+                dot_product = np.dot(vector_to_keep, vector_to_remove)
+                if dot_product < min_dot_product:
+                    min_dot_product = dot_product
+                    edge_that_should_not_be_removed = edge_that_can_be_removed
+
+            edges_that_can_be_removed.remove(edge_that_should_not_be_removed)
+            is_extra[edges_that_can_be_removed] = True
+
+        return is_extra
+
+    def get_unit_vector(self, node: int, edge: int) -> np.ndarray:
+        """
+        Returns the unit vector from a node to the other extremity of an edge
+        Args:
+            - node (int): a node, extremity of the edge
+            - edge (int): the edge
+        """
+        node_a, node_b = self.edge_nodes[edge]
+        other_node = node_b if node_a == node else node_a
+        vector = self.node_coords[other_node] - self.node_coords[node]
+        return vector / np.linalg.norm(vector)
+
+    def remove_edges(self, edges_mask: np.ndarray):
+        """
+        Removes some edges from the graph
+        Args:
+            - edges_mask (np.ndarray): boolean array, True for the edges to remove
+        """
+        self.edge_nodes = self.edge_nodes[~edges_mask]
+        self.edge_lengths = self.edge_lengths[~edges_mask]
+        self.edge_coords = [coords for coords, is_removed in zip(self.edge_coords, edges_mask) if not is_removed]
+
+    def merge_edges(self):
+        """
+        Merges the edges connected by a node with only 2 edges, like shapely's linemerge
+        """
+        indptr, edges = self.get_adjacency(np.ones(self.nb_edges, dtype=bool))
+        degrees = np.diff(indptr)
+        is_merged = np.zeros(self.nb_edges, dtype=bool)
+        chains = []
+
+        def follow_chain(start_node: int, start_edge: int) -> List[Tuple[int, bool]]:
+            """follows the edges from a node, through the nodes with 2 edges (edges as (edge, is_reversed))"""
+            chain = []
+            node, edge = start_node, start_edge
+            while True:
+                is_merged[edge] = True
+                is_reversed = self.edge_nodes[edge, 0] != node
+                chain.append((edge, is_reversed))
+                node = self.edge_nodes[edge, 0] if is_reversed else self.edge_nodes[edge, 1]
+                if degrees[node] != 2 or node == start_node:
+                    return chain
+                start, end = indptr[node], indptr[node + 1]
+                node_edges = edges[start:end]
+                edge = node_edges[1] if node_edges[0] == edge else node_edges[0]
+
+        # chains between 2 nodes that are not connected to 2 edges
+        for node in np.flatnonzero(degrees != 2):
+            start, end = indptr[node], indptr[node + 1]
+            for edge in edges[start:end]:
+                if not is_merged[edge]:
+                    chains.append(follow_chain(node, edge))
+        # remaining edges are isolated loops
+        for edge in np.flatnonzero(~is_merged):
+            if not is_merged[edge]:
+                chains.append(follow_chain(self.edge_nodes[edge, 0], edge))
+
+        edge_nodes, edge_lengths, edge_coords = [], [], []
+        for chain in chains:
+            coords = [
+                self.edge_coords[edge][::-1] if is_reversed else self.edge_coords[edge] for edge, is_reversed in chain
+            ]
+            # the first point of each next edge is the last point of the previous one
+            edge_coords.append(np.concatenate([coords[0]] + [next_coords[1:] for next_coords in coords[1:]]))
+            first_edge, first_is_reversed = chain[0]
+            last_edge, last_is_reversed = chain[-1]
+            edge_nodes.append(
+                (
+                    self.edge_nodes[first_edge, int(first_is_reversed)],
+                    self.edge_nodes[last_edge, int(not last_is_reversed)],
+                )
+            )
+            edge_lengths.append(sum(self.edge_lengths[edge] for edge, _ in chain))
+
+        self.edge_nodes = np.array(edge_nodes, dtype=int).reshape(-1, 2)
+        self.edge_lengths = np.array(edge_lengths, dtype=float)
+        self.edge_coords = edge_coords
+
+    def simplify(self, water_min_size: float, gap_points: List[Point]):
+        """
+        Removes the 'spikes' and merges the remaining lines, until the number of lines doesn't change anymore
+        (or there is only 1 line left)
+        Args:
+            - water_min_size (float): the lines longer than that are always kept
+            - gap_points (List[Point]): the points used to close gaps
+        """
+        nb_edges = self.nb_edges
+        while nb_edges > 1:
+            self.remove_edges(self.get_extra_edges(water_min_size, gap_points))
+            self.merge_edges()
+            if self.nb_edges == nb_edges:
+                break
+            nb_edges = self.nb_edges
+
+    def get_lines(self) -> np.ndarray:
+        """
+        Returns the edges as lines
+        """
+        if not self.edge_coords:
+            return np.array([], dtype=object)
+        coords = np.concatenate(self.edge_coords)
+        indexes = np.repeat(np.arange(self.nb_edges), [len(edge_coords) for edge_coords in self.edge_coords])
+        return shapely.linestrings(coords, indices=indexes)
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 """ Remove small holes """
+import geopandas as gpd
+import numpy as np
+import shapely
 from shapely.geometry import Polygon
 
 
@@ -25,3 +28,49 @@ def close_holes(polygon: Polygon, min_hole_area=None) -> Polygon:
     final_polygon = Polygon(shell=polygon.exterior, holes=interior_holes_filter)
 
     return final_polygon
+
+
+def _close_holes_polygons(geometries: np.ndarray, min_hole_area=None) -> np.ndarray:
+    """Remove the small holes of the polygons of an array: the rings are extracted and filtered by area
+    as arrays, and the polygons are rebuilt in bulk (other geometries are returned unchanged)"""
+    rings, indices = shapely.get_rings(geometries, return_index=True)
+
+    # The first ring of each polygon is its exterior
+    is_exterior = np.ones(len(rings), dtype=bool)
+    is_exterior[1:] = indices[1:] != indices[:-1]
+    if min_hole_area is None:
+        to_keep = is_exterior
+    else:
+        to_keep = is_exterior | (shapely.area(shapely.polygons(rings)) >= min_hole_area)
+
+    result = geometries.copy()
+    shapely.polygons(rings[to_keep], indices=indices[to_keep], out=result)
+
+    return result
+
+
+def close_holes_geoseries(polygons: gpd.GeoSeries, min_hole_area=None) -> gpd.GeoSeries:
+    """Remove small holes (surface < 100 m²) of all the polygons of a GeoSeries at once:
+    the rings are extracted and filtered by area as arrays, and the polygons are rebuilt in bulk.
+    MultiPolygons are split into their polygons, which are closed and grouped again.
+    Geometries that are not polygons (and empty geometries) are returned unchanged.
+
+    Args:
+        - polygons (gpd.GeoSeries): Hydro Mask geometries
+        - min_hole_area (int): close holes in Mask Hydro : keep only holes with area bigger
+                               than min_hole_area (> 100 m² by default)
+
+    Returns:
+        gpd.GeoSeries: Hydro Mask geometries without holes (< 100 m²)
+    """
+    geometries = np.asarray(polygons.values, dtype=object)
+    result = _close_holes_polygons(geometries, min_hole_area)
+
+    is_multipolygon = shapely.get_type_id(geometries) == shapely.GeometryType.MULTIPOLYGON
+    is_multipolygon &= ~shapely.is_empty(geometries)
+    if is_multipolygon.any():
+        parts, indices = shapely.get_parts(geometries[is_multipolygon], return_index=True)
+        parts = _close_holes_polygons(parts, min_hole_area)
+        result[is_multipolygon] = shapely.multipolygons(parts, indices=indices)
+
+    return gpd.GeoSeries(result, index=polygons.index, crs=polygons.crs)
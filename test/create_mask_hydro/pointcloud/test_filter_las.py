@@ -4,7 +4,12 @@ from pathlib import Path
 
 import numpy as np
 
-from lidro.create_mask_hydro.pointcloud.filter_las import filter_pointcloud
+from lidro.create_mask_hydro.pointcloud.filter_las import (
+    filter_point_columns,
+    filter_pointcloud,
+    get_class_lookup_table,
+)
+from lidro.create_mask_hydro.pointcloud.point_columns import PointColumns
 
 TMP_PATH = Path("./tmp/create_mask_hydro/pointcloud/filter_las")
 
@@ -43,3 +48,30 @@ def test_filter_pointcloud_default():
     assert isinstance(output, np.ndarray) is True
     assert np.all(np.isin(output[:, -1], [2, 3, 4]))
     assert output.shape[0] == 11
+
+
+def test_filter_point_columns_default():
+    points = PointColumns(
+        x=[6062.44, 6062.44, 6062.06, 6062.06, 6062.13, 6062.19],
+        y=[6626308.5, 6626306.0, 6626309.0, 6626308.5, 6626307.5, 6626301.0],
+        z=[186.1, 186.12, 186.08, 186.1, 186.12, 186.36],
+        classification=[2, 1, 2, 5, 2, 5],
+    )
+
+    output = filter_point_columns(points, [2, 3, 4])
+    assert isinstance(output, PointColumns)
+    assert output.classification.dtype == np.uint8
+    assert np.all(np.isin(output.classification, [2, 3, 4]))
+    assert len(output) == 3
+    assert np.array_equal(output.x, [6062.44, 6062.06, 6062.13])
+
+
+def test_get_class_lookup_table():
+    lookup_table = get_class_lookup_table([2, 66, 3])
+    assert lookup_table.shape == (256,)
+    assert np.array_equal(np.flatnonzero(lookup_table), [2, 3, 66])
+    # the table is built once for the same classes
+    assert get_class_lookup_table([66, 3, 2]) is lookup_table
+
+    classification = np.arange(256, dtype=np.uint8)
+    assert np.array_equal(lookup_table[classification], np.isin(classification, [2, 3, 66]))
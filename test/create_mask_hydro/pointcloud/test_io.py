@@ -5,7 +5,10 @@ from pathlib import Path
 import laspy
 import numpy as np
 
-from lidro.create_mask_hydro.pointcloud.io import get_pointcloud_origin
+from lidro.create_mask_hydro.pointcloud.io import (
+    get_pointcloud_origin,
+    get_pointcloud_origin_from_header,
+)
 
 TMP_PATH = Path("./tmp/create_mask_hydro/pointcloud/io")
 
@@ -24,3 +27,14 @@ def test_pointcloud_default():
     expected_origin = (706000, 6627000)
     origin_x, origin_y = get_pointcloud_origin(points=input_points, tile_size=1000)
     assert (origin_x, origin_y) == expected_origin  # get pointcloud origin
+
+
+def test_pointcloud_origin_from_header():
+    expected_origin = (706000, 6627000)
+    origin_x, origin_y = get_pointcloud_origin_from_header(LAS_FILE, tile_size=1000)
+    assert (origin_x, origin_y) == expected_origin
+
+
+def test_pointcloud_origin_from_header_inconsistent():
+    # the extent in the header is bigger than the tile size: the points have to be scanned
+    assert get_pointcloud_origin_from_header(LAS_FILE, tile_size=100) is None
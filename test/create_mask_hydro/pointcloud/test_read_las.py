@@ -5,7 +5,12 @@ from pathlib import Path
 import numpy as np
 from pyproj import CRS
 
-from lidro.create_mask_hydro.pointcloud.read_las import read_pointcloud
+from lidro.create_mask_hydro.pointcloud.point_columns import PointColumns
+from lidro.create_mask_hydro.pointcloud.read_las import (
+    read_pointcloud,
+    read_pointcloud_by_chunks,
+    read_pointcloud_columns,
+)
 
 TMP_PATH = Path("./tmp/create_mask_hydro/pointcloud/io")
 
@@ -24,3 +29,37 @@ def test_read_pointcloud_return_format_okay():
     assert isinstance(output, np.ndarray) is True
 
     assert crs == CRS.from_user_input("EPSG:2154")
+
+
+def test_read_pointcloud_columns_same_points():
+    output, _ = read_pointcloud(LAS_FILE)
+    points, crs = read_pointcloud_columns(LAS_FILE)
+
+    assert isinstance(points, PointColumns)
+    assert crs == CRS.from_user_input("EPSG:2154")
+    assert points.x.dtype == np.float64 and points.z.dtype == np.float32 and points.classification.dtype == np.uint8
+    assert np.array_equal(points.x, output[:, 0]) and np.array_equal(points.y, output[:, 1])
+    assert np.allclose(points.z, output[:, 2])
+    assert np.array_equal(points.classification, output[:, 3])
+
+
+def test_read_pointcloud_columns_by_small_chunks():
+    points, _ = read_pointcloud_columns(LAS_FILE)
+    points_small_chunks, _ = read_pointcloud_columns(LAS_FILE, chunk_size=10000)
+
+    assert len(points_small_chunks) == len(points) > 10000
+    assert np.array_equal(points_small_chunks.x, points.x)
+    assert np.array_equal(points_small_chunks.y, points.y)
+    assert np.array_equal(points_small_chunks.z, points.z)
+    assert np.array_equal(points_small_chunks.classification, points.classification)
+
+
+def test_read_pointcloud_by_chunks_same_points():
+    points, _ = read_pointcloud_columns(LAS_FILE)
+    chunks = list(read_pointcloud_by_chunks(LAS_FILE, chunk_size=10000))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 10000 for chunk in chunks)
+    assert np.array_equal(np.concatenate([chunk.x for chunk in chunks]), points.x)
+    assert np.array_equal(np.concatenate([chunk.y for chunk in chunks]), points.y)
+    assert np.array_equal(np.concatenate([chunk.classification for chunk in chunks]), points.classification)
@@ -10,6 +10,8 @@ from rasterio.transform import from_origin
 from lidro.create_mask_hydro.rasters.create_mask_raster import (
     create_occupancy_map,
     detect_hydro_by_tile,
+    init_occupancy_map,
+    update_occupancy_map,
 )
 
 TMP_PATH = Path("./tmp/create_mask_hydro/rasters/create_mask_raster")
@@ -43,6 +45,30 @@ def test_create_occupancy_map_default():
     assert np.all(occupancy_map == expected_occupancy)
 
 
+def test_create_occupancy_map_edges():
+    # points on the edges between pixels belong to the right/upper pixel, except on the right/top edges of the tile
+    # points outside of the tile are ignored
+    points = np.array([[10, 10, 0], [20, 0, 0], [12, 5, 0], [9.9, 5, 0], [15, 10.1, 0]])
+    expected_occupancy = np.zeros([10, 10])
+    expected_occupancy[0, 0] = 1
+    expected_occupancy[-1, -1] = 1
+    expected_occupancy[4, 2] = 1
+    occupancy_map = create_occupancy_map(points, tile_size=10, pixel_size=1, origin=(10, 10))
+    assert np.all(occupancy_map == expected_occupancy)
+
+
+def test_update_occupancy_map_by_chunks():
+    rng = np.random.default_rng(0)
+    points = rng.uniform([10, 0], [20, 10], size=(1000, 2))
+    expected_occupancy = create_occupancy_map(points, tile_size=10, pixel_size=0.5, origin=(10, 10))
+
+    occupancy_map = init_occupancy_map(tile_size=10, pixel_size=0.5)
+    for chunk in np.array_split(points, 7):
+        update_occupancy_map(occupancy_map, chunk[:, 0], chunk[:, 1], pixel_size=0.5, origin=(10, 10))
+    assert occupancy_map.shape == (20, 20)
+    assert np.array_equal(occupancy_map, expected_occupancy)
+
+
 @pytest.mark.returnfile
 def test_detect_hydro_by_tile_return_file():
     output_tif = TMP_PATH / "Semis_2021_0830_6291_LA93_IGN69_size.tif"
@@ -73,3 +99,26 @@ def test_detect_hydro_by_tile_return_file():
         dst.write(array, 1)
 
     assert Path(output_tif).exists()
+
+
+def test_detect_hydro_by_tile_by_chunks():
+    classes = [0, 1, 2, 3, 4, 5, 6, 17, 66]
+    array, origin = detect_hydro_by_tile(LAS_FILE, tile_size, pixel_size, classes=classes, dilation_size=3)
+    array_chunks, origin_chunks = detect_hydro_by_tile(
+        LAS_FILE, tile_size, pixel_size, classes=classes, dilation_size=3, chunk_size=100000
+    )
+
+    assert origin_chunks == origin
+    assert np.array_equal(array_chunks, array)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 100000])
+def test_detect_hydro_by_tile_origin_from_header(chunk_size):
+    classes = [0, 1, 2, 3, 4, 5, 6, 17, 66]
+    array, origin = detect_hydro_by_tile(LAS_FILE, tile_size, pixel_size, classes=classes, dilation_size=3)
+    array_header, origin_header = detect_hydro_by_tile(
+        LAS_FILE, tile_size, pixel_size, classes, 3, chunk_size=chunk_size, origin_from_header=True
+    )
+
+    assert origin_header == origin
+    assert np.array_equal(array_header, array)
@@ -0,0 +1,72 @@
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from lidro.create_mask_hydro.rasters import mosaic as mosaic_module
+from lidro.create_mask_hydro.rasters.create_mask_raster import detect_hydro_by_tile
+from lidro.create_mask_hydro.rasters.mosaic import (
+    add_tile_to_mosaic,
+    get_mosaic_extent,
+    get_tiles_origins,
+)
+
+TMP_PATH = Path("./tmp/create_mask_hydro/rasters/mosaic")
+
+INPUT_DIR = "./data/tile_0830_6291/pointcloud"
+LAS_FILENAME = "Semis_2021_0830_6291_LA93_IGN69.laz"
+
+tile_size = 1000
+pixel_size = 1
+classes = [0, 1, 2, 3, 4, 5, 6, 17, 66]
+
+
+def setup_module(module):
+    if TMP_PATH.is_dir():
+        shutil.rmtree(TMP_PATH)
+    os.makedirs(TMP_PATH)
+
+
+def test_get_mosaic_extent_default():
+    origins = [(1000, 5000), (2000, 5000), (1000, 4000), (3000, 3000)]
+    mosaic_origin, mosaic_shape = get_mosaic_extent(origins, tile_size=1000, pixel_size=0.5)
+    assert mosaic_origin == (1000, 5000)
+    assert mosaic_shape == (6000, 6000)
+
+
+@pytest.mark.parametrize("origin_from_header, chunk_size", [(False, None), (False, 100_000), (True, None)])
+def test_get_tiles_origins(origin_from_header, chunk_size):
+    origins = get_tiles_origins(INPUT_DIR, [LAS_FILENAME], tile_size, chunk_size, origin_from_header)
+    assert origins == {LAS_FILENAME: (830000, 6291000)}
+
+
+def test_get_tiles_origins_honours_origin_from_header(monkeypatch):
+    # a (fake) origin in the header: it is used only if origin_from_header is True
+    monkeypatch.setattr(mosaic_module, "get_pointcloud_origin_from_header", lambda las_file, tile_size: (0, 0))
+    assert get_tiles_origins(INPUT_DIR, [LAS_FILENAME], tile_size, origin_from_header=True) == {LAS_FILENAME: (0, 0)}
+    origins = get_tiles_origins(INPUT_DIR, [LAS_FILENAME], tile_size, origin_from_header=False)
+    assert origins == {LAS_FILENAME: (830000, 6291000)}
+
+
+def test_add_tile_to_mosaic_default():
+    origins = get_tiles_origins(INPUT_DIR, [LAS_FILENAME], tile_size)
+    tile_origin = origins[LAS_FILENAME]
+    assert tile_origin == (830000, 6291000)
+
+    # mosaic with an empty tile on the left and above the tile
+    mosaic_origin, mosaic_shape = get_mosaic_extent(
+        [tile_origin, (tile_origin[0] - tile_size, tile_origin[1] + tile_size)], tile_size, pixel_size
+    )
+    mosaic_path = TMP_PATH / "mosaic.tmp"
+    np.memmap(mosaic_path, dtype=np.uint8, mode="w+", shape=mosaic_shape).flush()
+
+    add_tile_to_mosaic(
+        LAS_FILENAME, INPUT_DIR, mosaic_path, mosaic_origin, mosaic_shape, pixel_size, tile_size, classes, 3
+    )
+
+    mosaic = np.memmap(mosaic_path, dtype=np.uint8, mode="r", shape=mosaic_shape)
+    water_mask, _ = detect_hydro_by_tile(os.path.join(INPUT_DIR, LAS_FILENAME), tile_size, pixel_size, classes, 3)
+    assert np.array_equal(mosaic[1000:, 1000:], water_mask)
+    assert not np.any(mosaic[:1000, :]) and not np.any(mosaic[:, :1000])
@@ -0,0 +1,43 @@
+import logging
+import os
+
+import pytest
+
+from lidro.create_mask_hydro.tile_executor import run_on_tiles
+
+
+def square_tile(filename, offset):
+    if filename == "fail":
+        raise ValueError("wrong tile")
+    return int(filename) ** 2 + offset
+
+
+def kill_worker(filename):
+    if filename == "kill":
+        os._exit(1)  # the worker process dies, as when it is killed for lack of memory
+    return filename
+
+
+@pytest.mark.parametrize("num_workers", [1, 3])
+def test_run_on_tiles_default(num_workers):
+    filenames = [str(i) for i in range(10)]
+    results = run_on_tiles(square_tile, filenames, (1,), num_workers)
+    assert results == {str(i): i**2 + 1 for i in range(10)}
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_run_on_tiles_failure(num_workers):
+    # the other tiles are processed, and the failure is raised at the end of the run
+    with pytest.raises(RuntimeError, match="1 tile"):
+        run_on_tiles(square_tile, ["1", "fail", "2"], (0,), num_workers)
+
+
+def test_run_on_tiles_broken_pool(caplog):
+    # the tiles that were not finished when the worker died are reported as failures
+    caplog.set_level(logging.INFO)
+    filenames = ["1", "kill", "2", "3"]
+    with pytest.raises(RuntimeError, match="tile") as error:
+        run_on_tiles(kill_worker, filenames, (), 2)
+    assert "kill" in str(error.value)
+    assert "Duration by tile" in caplog.text
+    assert "Tile kill failed: BrokenProcessPool" in caplog.text
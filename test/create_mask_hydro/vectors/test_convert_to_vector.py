@@ -3,10 +3,15 @@ import shutil
 from pathlib import Path
 
 import geopandas as gpd
+import numpy as np
 from pyproj import CRS
 from shapely.geometry import Polygon
 
-from lidro.create_mask_hydro.vectors.convert_to_vector import create_hydro_vector_mask
+from lidro.create_mask_hydro.rasters.create_mask_raster import detect_hydro_by_tile
+from lidro.create_mask_hydro.vectors.convert_to_vector import (
+    create_hydro_vector_mask,
+    create_hydro_vector_mask_from_mosaic,
+)
 
 TMP_PATH = Path("./tmp/create_mask_hydro/vectors/convert_to_vector")
 
@@ -39,3 +44,40 @@ def test_create_hydro_vector_mask_default():
 
     expected_number_of_geometries = 2820
     assert len(gdf) == expected_number_of_geometries  # the number of geometries must be identical
+
+
+def test_create_hydro_vector_mask_flatgeobuf():
+    # Same mask written as GeoJSON and as FlatGeobuf in the same run
+    output_geojson = TMP_PATH / "flatgeobuf" / "MaskHydro_Semis_2021_0830_6291_LA93_IGN69.GeoJSON"
+    output_fgb = TMP_PATH / "flatgeobuf" / "MaskHydro_Semis_2021_0830_6291_LA93_IGN69.fgb"
+    os.makedirs(output_fgb.parent)
+    crs = CRS.from_epsg(2154)
+    classes = [0, 1, 2, 3, 4, 5, 6, 17, 66]
+
+    create_hydro_vector_mask(las_file, output_geojson, 1, 1000, classes, crs, 3, driver="GeoJSON")
+    create_hydro_vector_mask(las_file, output_fgb, 1, 1000, classes, crs, 3, driver="FlatGeobuf")
+    assert output_fgb.exists()
+
+    gdf_geojson = gpd.read_file(output_geojson)
+    gdf_fgb = gpd.read_file(output_fgb)
+    assert gdf_fgb.crs.to_string() == crs
+    assert all(isinstance(geom, Polygon) for geom in gdf_fgb.geometry)
+    assert len(gdf_fgb) == len(gdf_geojson) > 0
+    # the FlatGeobuf driver sorts the features along its spatial index: compare the sets of geometries
+    assert set(gdf_fgb.geometry.normalize().to_wkt()) == set(gdf_geojson.geometry.normalize().to_wkt())
+
+
+def test_create_hydro_vector_mask_from_mosaic_by_windows():
+    crs = CRS.from_epsg(2154)
+    water_mask, origin = detect_hydro_by_tile(las_file, 1000, 1, [0, 1, 2, 3, 4, 5, 6, 17, 66], 3)
+    polygons = {}
+    for window_size in [1000, 300]:
+        output_mosaic = TMP_PATH / f"MaskHydro_mosaic_{window_size}.fgb"
+        create_hydro_vector_mask_from_mosaic(water_mask, origin, 1, output_mosaic, crs, "FlatGeobuf", window_size)
+        # the polygons are made valid when they are merged (polygons touching at a point are split)
+        polygons[window_size] = gpd.read_file(output_mosaic).geometry.make_valid().explode(index_parts=False)
+
+    # the polygons crossing the borders of the windows are stitched: same polygons as with a single window
+    assert len(polygons[300]) == len(polygons[1000])
+    assert np.array_equal(np.sort(polygons[300].area), np.sort(polygons[1000].area))
+    assert polygons[300].unary_union.symmetric_difference(polygons[1000].unary_union).area == 0
@@ -0,0 +1,113 @@
+import os
+import shutil
+from pathlib import Path
+
+import geopandas as gpd
+import pytest
+from pyproj import CRS
+from shapely.geometry import Polygon, box
+from shapely.ops import unary_union
+
+from lidro.merge_mask_hydro.vectors.hierarchical_union import (
+    get_cell,
+    hierarchical_union,
+    is_inside_cell,
+    read_mask,
+    read_mask_bounds,
+)
+
+TMP_PATH = Path("./tmp/merge_mask_hydro/vectors/hierarchical_union")
+CRS_2154 = CRS.from_epsg(2154)
+
+# masks of a block of 3x2 tiles (tile_size = 100): a river crossing the first row of tiles,
+# a lake inside a tile, and a pond touching the border between two tiles of the second row
+MASKS = {
+    (0, 0): [box(0, 40, 100, 60), box(20, 10, 30, 20)],
+    (1, 0): [box(100, 40, 200, 60)],
+    (2, 0): [box(200, 40, 250, 60), box(260, 70, 280, 90)],
+    (0, 1): [box(60, 150, 100, 170)],
+    (1, 1): [box(100, 150, 120, 170), box(150, 110, 160, 120)],
+    (2, 1): [],
+}
+
+
+def setup_module(module):
+    if TMP_PATH.is_dir():
+        shutil.rmtree(TMP_PATH)
+    os.makedirs(TMP_PATH)
+
+
+def write_masks(folder, masks):
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for (col, row), polygons in masks.items():
+        path = os.path.join(folder, f"MaskHydro_{col}_{row}.GeoJSON")
+        gpd.GeoDataFrame(geometry=polygons, crs=CRS_2154).to_file(path, driver="GeoJSON")
+        paths.append(path)
+    return paths
+
+
+def test_get_cell_and_is_inside_cell():
+    assert get_cell(box(100, 40, 200, 60), 100) == (1, 0)
+    assert is_inside_cell(box(100, 40, 200, 60), (1, 0), 100, strict=False)
+    assert not is_inside_cell(box(100, 40, 200, 60), (1, 0), 100, strict=True)
+    assert is_inside_cell(box(150, 10, 160, 20), (1, 0), 100, strict=True)
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_hierarchical_union_same_as_unary_union(num_workers):
+    paths = write_masks(TMP_PATH / f"masks_{num_workers}", MASKS)
+
+    polygons = hierarchical_union(paths, CRS_2154, 100, num_workers)
+
+    assert all(isinstance(polygon, Polygon) for polygon in polygons)
+    expected = list(unary_union([polygon for polygons in MASKS.values() for polygon in polygons]).geoms)
+    assert len(polygons) == len(expected) == 5
+    assert unary_union(polygons).symmetric_difference(unary_union(expected)).area == pytest.approx(0)
+
+
+def test_hierarchical_union_read_by_blocks():
+    # the masks read by the processes (from their bounds) give the same union as the masks already read
+    paths = write_masks(TMP_PATH / "masks_by_blocks", MASKS)
+    assert read_mask_bounds(paths[0]) == (0, 10, 100, 60)
+    assert read_mask_bounds(paths[-1]) is None  # empty mask
+
+    polygons = hierarchical_union(paths, CRS_2154, 100, num_workers=2)
+    geometries = [read_mask(path, CRS_2154) for path in paths]
+    polygons_from_geometries = hierarchical_union(paths, CRS_2154, 100, geometries=geometries)
+
+    assert len(polygons) == len(polygons_from_geometries) == 5
+    assert unary_union(polygons).symmetric_difference(unary_union(polygons_from_geometries)).area == pytest.approx(0)
+
+
+def test_hierarchical_union_masks_outside_their_tile():
+    # masks which are not aligned on the tiles: polygons must not be set apart before the last union
+    masks = {(0, 0): [box(0, 0, 150, 50)], (1, 0): [box(140, 0, 160, 50), box(120, 60, 130, 70)]}
+    paths = write_masks(TMP_PATH / "masks_unaligned", masks)
+
+    polygons = hierarchical_union(paths, CRS_2154, 100)
+
+    assert len(polygons) == 2
+    assert sorted(polygon.area for polygon in polygons) == pytest.approx([100, 160 * 50])
+
+
+def test_hierarchical_union_negative_cells():
+    # tiles on both sides of 0: a river crossing the 4 tiles around the origin, and a lake inside a tile
+    masks = {
+        (-1, -1): [box(-100, -10, 0, 0), box(-50, -80, -40, -70)],
+        (0, -1): [box(0, -10, 100, 0)],
+        (-1, 0): [box(-100, 0, 0, 10)],
+        (0, 0): [box(0, 0, 100, 10)],
+    }
+    paths = write_masks(TMP_PATH / "masks_negative", masks)
+
+    polygons = hierarchical_union(paths, CRS_2154, 100)
+
+    assert len(polygons) == 2
+    assert sorted(polygon.area for polygon in polygons) == pytest.approx([100, 200 * 20])
+
+
+def test_hierarchical_union_empty():
+    paths = write_masks(TMP_PATH / "masks_empty", {(0, 0): []})
+
+    assert hierarchical_union(paths, CRS_2154, 100) == []
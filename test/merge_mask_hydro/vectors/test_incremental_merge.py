@@ -0,0 +1,100 @@
+import os
+import shutil
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from pyproj import CRS
+from shapely.geometry import box
+
+from lidro.merge_mask_hydro.vectors.incremental_merge import (
+    INDEX_FILENAME,
+    assign_components,
+    get_components_tiles,
+)
+from lidro.merge_mask_hydro.vectors.merge_vector import merge_geom
+
+TMP_PATH = Path("./tmp/merge_mask_hydro/vectors/incremental_merge")
+CRS_2154 = CRS.from_epsg(2154)
+PARAMETERS = (CRS_2154, 50, 0.5, -0.5, 0.1, 100, 1)
+
+# masks of a block of 3x2 tiles (tile_size = 100)
+MASKS = {
+    (0, 0): [box(0, 40, 100, 60), box(20, 10, 30, 20)],
+    (1, 0): [box(100, 40, 200, 60)],
+    (2, 0): [box(200, 40, 250, 60), box(260, 70, 280, 90)],
+    (0, 1): [box(60, 150, 100, 170)],
+    (1, 1): [box(100, 150, 120, 170), box(150, 100, 160, 120)],
+    (2, 1): [box(220, 120, 240, 140)],
+}
+
+
+def setup_module(module):
+    if TMP_PATH.is_dir():
+        shutil.rmtree(TMP_PATH)
+    os.makedirs(TMP_PATH)
+
+
+def write_mask(folder, cell, polygons):
+    path = os.path.join(folder, f"MaskHydro_{cell[0]}_{cell[1]}.GeoJSON")
+    gpd.GeoDataFrame(geometry=polygons, crs=CRS_2154).to_file(path, driver="GeoJSON")
+
+
+def read_merge(folder):
+    return gpd.read_file(os.path.join(folder, "MaskHydro_merge.geojson"))
+
+
+def assert_same_merge(gdf, expected):
+    # unions made in a different order can start the rings on different vertices, so the buffers and the
+    # simplification can give slightly different polygons
+    assert len(gdf) == len(expected)
+    assert sorted(gdf.area) == pytest.approx(sorted(expected.area), rel=1e-3)
+    assert gdf.unary_union.symmetric_difference(expected.unary_union).area < 1
+
+
+def test_get_components_tiles():
+    tiles = {"a": {"cell": [0, 0]}, "b": {"cell": [1, 0]}, "c": {"cell": None}}
+    components = np.array([box(10, 10, 20, 20), box(50, 50, 150, 60), box(300, 0, 310, 10)], dtype=object)
+
+    assert get_components_tiles(components, tiles, 100) == [["a"], ["a", "b"], []]
+
+
+def test_assign_components():
+    components = np.array([box(0, 0, 10, 10), box(11, 0, 20, 10), box(50, 50, 60, 60)], dtype=object)
+    polygons = np.array([box(1, 1, 10.5, 9), box(10.8, 1, 19, 9), box(61, 61, 62, 62)], dtype=object)
+
+    assert list(assign_components(polygons, components)) == [0, 1, 2]
+
+
+def test_merge_geom_incremental_same_as_full_merge():
+    input_folder = TMP_PATH / "masks"
+    output_incremental = TMP_PATH / "incremental"
+    output_full = TMP_PATH / "full"
+    for folder in (input_folder, output_incremental, output_full):
+        os.makedirs(folder)
+    for cell, polygons in MASKS.items():
+        write_mask(input_folder, cell, polygons)
+
+    merge_geom(input_folder, output_incremental, *PARAMETERS, incremental=True)
+    assert (output_incremental / INDEX_FILENAME).exists()
+    merge_geom(input_folder, output_full, *PARAMETERS)
+    assert_same_merge(read_merge(output_incremental), read_merge(output_full))
+
+    # Nothing changed: the merged mask is not written again
+    mtime = os.stat(output_incremental / "MaskHydro_merge.geojson").st_mtime_ns
+    merge_geom(input_folder, output_incremental, *PARAMETERS, incremental=True)
+    assert os.stat(output_incremental / "MaskHydro_merge.geojson").st_mtime_ns == mtime
+
+    assert len(read_merge(output_incremental)) == 6
+
+    # A tile is modified (the river is now linked to the pond of the tile above), a tile is removed and one is added
+    write_mask(input_folder, (1, 0), [box(100, 40, 200, 60), box(150, 60, 160, 100)])
+    os.remove(input_folder / "MaskHydro_2_1.GeoJSON")
+    write_mask(input_folder, (0, 2), [box(60, 200, 90, 230)])
+
+    merge_geom(input_folder, output_incremental, *PARAMETERS, incremental=True)
+    merge_geom(input_folder, output_full, *PARAMETERS)
+    gdf = read_merge(output_incremental)
+    assert_same_merge(gdf, read_merge(output_full))
+    assert len(gdf) == 5
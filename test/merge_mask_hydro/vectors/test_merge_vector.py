@@ -4,9 +4,12 @@ from pathlib import Path
 
 import geopandas as gpd
 from pyproj import CRS
-from shapely.geometry import Polygon
+from shapely.geometry import Polygon, box
 
-from lidro.merge_mask_hydro.vectors.merge_vector import merge_geom
+from lidro.merge_mask_hydro.vectors.merge_vector import (
+    merge_geom,
+    post_process_polygons_by_chunks,
+)
 
 TMP_PATH = Path("./tmp/merge_mask_hydro/vectors/merge_mask_hydro")
 
@@ -40,3 +43,58 @@ def test_create_hydro_vector_mask_default():
 
     expected_number_of_geometries = 3
     assert len(gdf) == expected_number_of_geometries  # One geometry
+
+
+def test_merge_geom_flatgeobuf():
+    # Same masks by tile, stored as GeoJSON and as FlatGeobuf files, merged in the same run
+    input_folder_fgb = TMP_PATH / "mask_hydro_fgb"
+    output_folder_geojson = TMP_PATH / "merge_geojson"
+    output_folder_fgb = TMP_PATH / "merge_fgb"
+    os.makedirs(input_folder_fgb)
+    os.makedirs(output_folder_geojson)
+    os.makedirs(output_folder_fgb)
+    for file in os.listdir(input_folder):
+        if file.endswith(".GeoJSON"):
+            gdf = gpd.read_file(os.path.join(input_folder, file))
+            gdf.to_file(input_folder_fgb / file.replace(".GeoJSON", ".fgb"), driver="FlatGeobuf")
+    crs = CRS.from_epsg(2154)
+
+    merge_geom(input_folder, output_folder_geojson, crs, 150, 0.5, -1.5, 1)
+    merge_geom(input_folder_fgb, output_folder_fgb, crs, 150, 0.5, -1.5, 1)
+
+    gdf_geojson = gpd.read_file(output_folder_geojson / "MaskHydro_merge.geojson")
+    gdf_fgb = gpd.read_file(output_folder_fgb / "MaskHydro_merge.geojson")
+    assert gdf_fgb.crs.to_string() == crs
+    assert len(gdf_fgb) == len(gdf_geojson) > 0
+    assert set(gdf_fgb.geometry.normalize().to_wkt()) == set(gdf_geojson.geometry.normalize().to_wkt())
+
+
+def test_post_process_polygons_by_chunks_same_as_serial():
+    # squares with a small hole (closed) and a big hole (kept)
+    polygons = gpd.GeoSeries(
+        [box(x, 0, x + 30, 30).difference(box(x + 5, 5, x + 5 + (x % 3 + 1) * 5, 10)) for x in range(0, 2000, 50)],
+        crs=CRS.from_epsg(2154),
+    )
+
+    serial = post_process_polygons_by_chunks(polygons, 0.5, -1.5, 1, 40, num_workers=1)
+    parallel = post_process_polygons_by_chunks(polygons, 0.5, -1.5, 1, 40, num_workers=3)
+
+    assert len(serial) == len(parallel) == len(polygons)
+    assert serial.reset_index(drop=True).geom_equals_exact(parallel, 0).all()
+    assert {len(polygon.interiors) for polygon in parallel} == {0, 1}
+
+
+def test_merge_geom_single_tile():
+    # a single mask by tile (not a mosaic): its polygons are unioned as the masks of several tiles
+    input_folder_single = TMP_PATH / "mask_hydro_single"
+    output_folder_single = TMP_PATH / "merge_single"
+    os.makedirs(input_folder_single)
+    os.makedirs(output_folder_single)
+    crs = CRS.from_epsg(2154)
+    gdf = gpd.GeoDataFrame(geometry=[box(0, 0, 50, 50), box(40, 0, 90, 50)], crs=crs)
+    gdf.to_file(input_folder_single / "MaskHydro_tile.GeoJSON", driver="GeoJSON")
+
+    merge_geom(input_folder_single, output_folder_single, crs, 150, 0.5, -1.5, 1, tile_size=100)
+
+    gdf = gpd.read_file(output_folder_single / "MaskHydro_merge.geojson")
+    assert len(gdf) == 1
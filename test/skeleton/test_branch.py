@@ -1,17 +1,24 @@
 import sys
 
 import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
 from hydra import compose, initialize
 from omegaconf import DictConfig
 from shapely import LineString, Point
+from shapely.geometry import MultiLineString, box
 
 from lidro.skeleton.branch import (
     PRECISION,
     Branch,
     cut,
     cut_both_ends,
+    cut_lines,
+    cut_lines_both_ends,
     get_df_points_from_gdf,
-    get_vertices_dict,
+    get_vertices_positions_dict,
+    get_voronoi_windows,
     line_merge,
 )
 
@@ -37,6 +44,31 @@ def test_get_df_points_from_gdf():
     assert len(df_all_coords) == 235
 
 
+def test_get_df_points_from_gdf_geometry_types():
+    polygon_with_hole = box(0, 0, 10, 10).difference(box(4, 4, 6, 6))  # only the exterior is used
+    line = LineString([(10, 10), (20, 20)])  # (10, 10) is already a point of the polygon
+    multi_line = MultiLineString([[(20, 20), (30, 20)], [(40, 40), (50, 50)]])
+    gdf = gpd.GeoDataFrame(geometry=[polygon_with_hole, line, multi_line], crs=CRS_FOR_TEST)
+
+    df_all_coords = get_df_points_from_gdf(gdf)
+
+    assert list(df_all_coords.columns) == ["x", "y"]
+    assert gdf.geom_type.tolist() == ["Polygon", "LineString", "MultiLineString"]  # gdf is not modified
+    assert set(zip(df_all_coords["x"], df_all_coords["y"])) == {
+        (0, 0),
+        (10, 0),
+        (10, 10),
+        (0, 10),
+        (20, 20),
+        (30, 20),
+        (40, 40),
+        (50, 50),
+    }
+
+    with pytest.raises(NotImplementedError):
+        get_df_points_from_gdf(gpd.GeoDataFrame(geometry=[Point(0, 0)], crs=CRS_FOR_TEST))
+
+
 def test_line_merge():
     """test of line_merge"""
     point_0_0 = [0, 0]
@@ -78,7 +110,7 @@ def test_line_merge():
             assert point_0_4 in line.coords
 
 
-def test_get_vertices_dict():
+def test_get_vertices_positions_dict_extremities():
     point_0_0 = [0, 0]
     point_0_1 = [0, 1]
     point_0_2 = [0, 2]
@@ -100,14 +132,50 @@ def test_get_vertices_dict():
 
     gdf_gap_lines = gpd.GeoDataFrame(geometry=line_list).set_crs(CRS_FOR_TEST, allow_override=True)
 
-    vertices_dict = get_vertices_dict(gdf_gap_lines)
+    vertices_dict = get_vertices_positions_dict(gdf_gap_lines)
 
     assert len(vertices_dict) == 7
-    assert vertices_dict[Point(point_0_0)] == [line_1]
-    assert vertices_dict[Point(point_0_6)] == [line_4]
-    assert vertices_dict[Point(point_2_4)] == [line_6]
-    assert len(vertices_dict[Point(point_0_2)]) == 2
-    assert len(vertices_dict[Point(point_0_4)]) == 3
+    assert vertices_dict[Point(point_0_0)] == [0]  # line_1
+    assert vertices_dict[Point(point_0_6)] == [3]  # line_4
+    assert vertices_dict[Point(point_2_4)] == [5]  # line_6
+    assert vertices_dict[Point(point_0_2)] == [0, 1]
+    assert vertices_dict[Point(point_0_4)] == [1, 2, 4]
+
+
+def test_get_vertices_positions_dict():
+    line_1 = LineString([(0, 0), (0, 1), (0, 2)])
+    line_2 = LineString([(0, 2), (0, 4)])
+    line_3 = LineString([(0, 4), (1, 4)])
+    loop = LineString([(5, 5), (6, 5), (6, 6), (5, 5)])
+    gdf_lines = gpd.GeoDataFrame(geometry=[line_1, loop, line_2, line_3], index=[10, 11, 12, 13], crs=CRS_FOR_TEST)
+
+    vertices_dict = get_vertices_positions_dict(gdf_lines)
+
+    assert vertices_dict == {Point(0, 0): [0], Point(0, 2): [0, 2], Point(0, 4): [2, 3], Point(1, 4): [3]}
+
+
+def test_shorten_lines_by_position():
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(config_name="configs_lidro.yaml", overrides=["skeleton.clipping_length=10"])
+        branch = Branch(config, "branch", box(0, -10, 400, 60), CRS_FOR_TEST)
+        # a "Y" (3 lines with an extremity each) and a lone line (cut at both ends), with a non default index
+        lines = [
+            LineString([(0, 0), (100, 0)]),
+            LineString([(100, 0), (200, 0)]),
+            LineString([(100, 0), (100, 50)]),
+            LineString([(300, 0), (400, 0)]),
+        ]
+        branch.gdf_skeleton_lines = gpd.GeoDataFrame(geometry=lines, index=[5, 6, 7, 8], crs=CRS_FOR_TEST)
+
+        branch.shorten_lines()
+
+        assert list(branch.gdf_skeleton_lines.index) == [5, 6, 7, 8]
+        assert [list(line.coords) for line in branch.gdf_skeleton_lines["geometry"]] == [
+            [(10, 0), (100, 0)],
+            [(190, 0), (100, 0)],  # the lines cut at their ending point are reversed
+            [(100, 40), (100, 0)],
+            [(390, 0), (310, 0)],
+        ]
 
 
 def test_create_voronoi_lines():
@@ -124,7 +192,7 @@ def test_create_voronoi_lines():
 
         voronoi_merged = line_merge(voronoi_lines, CRS_FOR_TEST)
         assert len(voronoi_merged) == 157
-        vertices_dict = get_vertices_dict(voronoi_merged)
+        vertices_dict = get_vertices_positions_dict(voronoi_merged)
         # count number of extremities :
         nb_extremities = 0
         for lines_list in vertices_dict.values():
@@ -133,6 +201,20 @@ def test_create_voronoi_lines():
         assert nb_extremities == 80
 
 
+def test_create_voronoi_lines_within_mask():
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(config_name="configs_lidro.yaml")
+        # a concave (L-shaped) mask: part of its voronoi diagram is outside of it
+        l_shaped_mask = box(0, 0, 100, 20).union(box(0, 0, 20, 100))
+        branch = Branch(config, "l_shaped", l_shaped_mask, CRS_FOR_TEST)
+        voronoi_lines = branch.create_voronoi_lines()
+
+        assert len(voronoi_lines) > 0
+        assert list(voronoi_lines.index) == list(range(len(voronoi_lines)))
+        assert voronoi_lines.crs == CRS_FOR_TEST
+        assert voronoi_lines.within(l_shaped_mask).all()
+
+
 def test_creation_skeleton_lines():
     """test creation/simplification of skeleton lines for a branch"""
     with initialize(version_base="1.2", config_path="../../configs"):
@@ -149,7 +231,7 @@ def test_creation_skeleton_lines():
         branch_1.simplify()
 
         # number of extremity of branch_1's skeleton
-        vertices_dict = get_vertices_dict(branch_1.gdf_skeleton_lines)
+        vertices_dict = get_vertices_positions_dict(branch_1.gdf_skeleton_lines)
         extremities_cpt = 0
         for lines_list in vertices_dict.values():
             if len(lines_list) == 1:
@@ -158,6 +240,27 @@ def test_creation_skeleton_lines():
         assert extremities_cpt == 3  # check that this branch's skeleton has exactly 3 extremities
 
 
+def test_create_skeleton_with_gap_points():
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(config_name="configs_lidro.yaml")
+        branch = Branch(config, "branch", box(0, 0, 100, 20), CRS_FOR_TEST)
+        gap_points = [Point(0, 10), Point(100, 10), Point(50, 0)]
+        branch.gap_points = list(gap_points)
+        voronoi_points = get_df_points_from_gdf(branch.create_voronoi_lines()).to_numpy()
+
+        branch.create_skeleton()
+
+        skeleton = shapely.union_all(branch.gdf_skeleton_lines.geometry.values)
+        for gap_point in gap_points:
+            # each gap point is connected to the skeleton, by a line toward the nearest voronoi vertex
+            assert skeleton.distance(gap_point) == 0
+            nearest_distance = np.hypot(*(voronoi_points - (gap_point.x, gap_point.y)).T).min()
+            # (the voronoi lines are rounded to PRECISION in the skeleton)
+            assert skeleton.intersection(gap_point.buffer(nearest_distance / 2)).length == pytest.approx(
+                nearest_distance / 2, abs=PRECISION
+            )
+
+
 def test_cut():
     point_0_0 = [0, 0]
     point_0_1 = [0, 1]
@@ -209,6 +312,34 @@ def test_cut_both_ends():
     assert result_line.length == 1
 
 
+def test_cut_lines():
+    lines = [
+        LineString([(0, 0), (0, 1), (0, 2), (0, 4), (0, 6)]),
+        LineString([(10, 0), (20, 0), (20, 10)]),
+        LineString([(0, 0), (0.5, 0)]),  # shorter than 1m: not cut
+        LineString([(5, 5), (5, 6), (5, 9)]),
+    ]
+    result_lines = cut_lines(np.array(lines, dtype=object), np.array([2, 15, 3, 0]))
+
+    assert [list(line.coords) for line in result_lines] == [
+        [(0, 2), (0, 4), (0, 6)],
+        [(20, 5), (20, 10)],
+        [(0, 0), (0.5, 0)],
+        [(5, 5), (5, 6), (5, 9)],
+    ]
+    # the cut keeps 1m of the lines
+    assert shapely.length(cut_lines(np.array(lines, dtype=object), np.full(4, 100))).tolist() == [1, 1, 0.5, 1]
+    assert len(cut_lines(np.array([], dtype=object), np.array([]))) == 0
+
+
+def test_cut_lines_both_ends():
+    lines = [LineString([(0, 0), (0, 1), (0, 2), (0, 4), (0, 5), (0, 6)]), LineString([(10, 0), (20, 0), (20, 10)])]
+    result_lines = cut_lines_both_ends(np.array(lines, dtype=object), np.array([2, 4]))
+
+    # the lines are reversed
+    assert [list(line.coords) for line in result_lines] == [[(0, 4), (0, 2)], [(20, 6), (20, 0), (14, 0)]]
+
+
 def test_shorten_lines():
     """test creation/simplification of skeleton lines for a branch"""
     with initialize(version_base="1.2", config_path="../../configs"):
@@ -232,3 +363,70 @@ def test_shorten_lines():
         branch_1.shorten_lines()
         total_length_after = sum(line.length for line in branch_1.gdf_skeleton_lines["geometry"])
         assert abs(total_length_after - 675.059) < PRECISION
+
+
+def test_get_candidates():
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(
+            config_name="configs_lidro.yaml",
+            overrides=["skeleton.max_gap_width=10", "skeleton.branch.max_gap_candidates=3"],
+        )
+        branch_1 = Branch(config, "branch_1", box(0, 0, 10, 10), CRS_FOR_TEST)
+        branch_2 = Branch(config, "branch_2", box(13, 0, 23, 10).segmentize(5), CRS_FOR_TEST)
+        branch_3 = Branch(config, "branch_3", box(100, 0, 110, 10), CRS_FOR_TEST)
+
+        candidates = branch_1.get_candidates(branch_2)
+        assert [candidate.squared_distance for candidate in candidates] == [9, 9, 34]
+        assert {(candidate.extremity_1, candidate.extremity_2) for candidate in candidates[:2]} == {
+            ((10, 0), (13, 0)),
+            ((10, 10), (13, 10)),
+        }
+        assert all(candidate.branch_1 is branch_1 and candidate.branch_2 is branch_2 for candidate in candidates)
+
+        assert branch_1.get_candidates(branch_3) == []
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_create_voronoi_lines_by_windows(num_workers):
+    # a long meandering river, 30m wide
+    x = np.arange(0, 2000, 10)
+    river_mask = LineString(np.column_stack((x, 100 * np.sin(x / 150)))).buffer(15, cap_style="flat")
+    skeletons = []
+    for window_size in ["null", 300]:
+        with initialize(version_base="1.2", config_path="../../configs"):
+            config = compose(
+                config_name="configs_lidro.yaml",
+                overrides=[
+                    f"skeleton.branch.voronoi_window_size={window_size}",
+                    "skeleton.branch.voronoi_window_overlap=50",
+                    f"skeleton.branch.voronoi_num_workers={num_workers}",
+                ],
+            )
+            branch = Branch(config, "river", river_mask, CRS_FOR_TEST)
+            voronoi_lines = branch.create_voronoi_lines()
+            branch.create_skeleton()
+            branch.simplify()
+            skeleton = shapely.union_all(branch.gdf_skeleton_lines.geometry.values)
+            skeletons.append((voronoi_lines.length.sum(), skeleton))
+
+    # the voronoi lines computed by windows are the same as the ones computed at once
+    (length, skeleton), (length_by_windows, skeleton_by_windows) = skeletons
+    assert length_by_windows == pytest.approx(length, rel=1e-9)
+    assert skeleton.symmetric_difference(skeleton_by_windows).length < PRECISION
+
+
+def test_get_voronoi_windows():
+    # a long straight river, with its sites every 2m on its banks
+    river_mask = LineString([(0, 0), (10000, 0)]).buffer(15, cap_style="flat")
+    sites = shapely.get_coordinates(river_mask.segmentize(2))
+    voronoi_windows = get_voronoi_windows(sites, 300, 50)
+
+    # the windows along the river, and the neighbours with sites in their margin (the row below, the column before)
+    assert len(voronoi_windows) == 35 * 2
+    for window_sites, (xmin, ymin, xmax, ymax) in voronoi_windows:
+        # each window gets only the sites of its extended window, not the far-away ones
+        assert (window_sites[:, 0] >= xmin - 50).all() and (window_sites[:, 0] <= xmax + 50).all()
+        assert (window_sites[:, 1] >= ymin - 50).all() and (window_sites[:, 1] <= ymax + 50).all()
+        assert len(window_sites) < len(sites) / 10
+    # each site is given to a few windows only
+    assert sum(len(window_sites) for window_sites, _ in voronoi_windows) < 10 * len(sites)
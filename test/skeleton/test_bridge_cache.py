@@ -0,0 +1,182 @@
+import os
+import shutil
+from pathlib import Path
+
+import geopandas as gpd
+import pytest
+from dotenv import load_dotenv
+from hydra import compose, initialize
+from shapely.geometry import LineString, box
+
+from lidro.skeleton.branch import Candidate
+from lidro.skeleton.bridge_cache import (
+    are_bridges_covering,
+    export_bridges,
+    query_bridges_across_lines,
+    read_bridges,
+    read_bridges_bbox,
+    write_bridges,
+)
+from lidro.skeleton.create_skeleton_lines import (
+    BridgesChecker,
+    check_bridges_across_gaps,
+    create_branches_list,
+    create_branches_pair,
+    db_connector,
+    select_candidates,
+)
+
+load_dotenv()
+
+DB_UNI_USER = os.getenv("DB_UNI_USER")
+DB_UNI_PASSWORD = os.getenv("DB_UNI_PASSWORD")
+CRS = 2154
+TMP_PATH = Path("./tmp/skeleton/bridge_cache")
+BRIDGES_PATH = TMP_PATH / "bridges.fgb"
+BRIDGES_BBOX = (-50, -50, 300, 150)
+
+
+def setup_module(module):
+    if TMP_PATH.is_dir():
+        shutil.rmtree(TMP_PATH)
+    os.makedirs(TMP_PATH)
+    # a linear bridge across y = 0 (at x = 47.5), and a surface bridge far from the branches
+    gdf_bridges = gpd.GeoDataFrame(
+        {"table": ["Construction_lineaire", "Construction_surfacique"]},
+        geometry=[LineString([(45, -10), (55, 30)]), box(140, 100, 160, 120)],
+        crs=CRS,
+    )
+    write_bridges(gdf_bridges, BRIDGES_BBOX, BRIDGES_PATH)
+
+
+def test_query_bridges_across_lines():
+    bridges_tree = read_bridges(BRIDGES_PATH)
+    lines = ["LINESTRING(40 0, 60 0)", "LINESTRING(80 0, 100 0)", "LINESTRING(145 110, 146 110)"]
+
+    assert query_bridges_across_lines(lines, bridges_tree) == [True, False, True]
+    assert query_bridges_across_lines([], bridges_tree) == []
+
+
+def test_are_bridges_covering():
+    assert read_bridges_bbox(BRIDGES_PATH) == BRIDGES_BBOX
+    assert are_bridges_covering((0, 0, 200, 40), BRIDGES_PATH)
+    assert are_bridges_covering(BRIDGES_BBOX, BRIDGES_PATH)
+    assert not are_bridges_covering((0, 0, 400, 40), BRIDGES_PATH)  # a bigger mask
+    assert not are_bridges_covering((1000, 1000, 1100, 1100), BRIDGES_PATH)  # another block
+    assert not are_bridges_covering((0, 0, 200, 40), TMP_PATH / "missing.fgb")
+
+    # bridges without their bounding box: the area they cover is unknown
+    no_bbox_path = TMP_PATH / "bridges_no_bbox.fgb"
+    gpd.read_file(BRIDGES_PATH).to_file(no_bbox_path)
+    assert read_bridges_bbox(no_bbox_path) is None
+    assert not are_bridges_covering((0, 0, 200, 40), no_bbox_path)
+
+
+def test_check_bridges_across_gaps_outside_cache():
+    small_bridges_path = TMP_PATH / "bridges_small.fgb"
+    write_bridges(gpd.read_file(BRIDGES_PATH), (0, 0, 100, 40), small_bridges_path)
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(
+            config_name="configs_lidro.yaml",
+            overrides=[f"skeleton.db_uni.bridges_cache_path={small_bridges_path}"],
+        )
+        # the first gap is inside the area of the bridges, the second one is not
+        candidate_inside = Candidate(None, None, (25, 10), (75, 10), 2500)
+        candidate_outside = Candidate(None, None, (125, 30), (175, 30), 2500)
+        assert check_bridges_across_gaps(config, [candidate_inside]) == [True]
+        with pytest.raises(ValueError):
+            check_bridges_across_gaps(config, [candidate_inside, candidate_outside])
+
+
+def test_select_candidates_with_bridges_cache():
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(
+            config_name="configs_lidro.yaml",
+            overrides=[
+                "skeleton.db_uni.db_using_db=True",
+                f"skeleton.db_uni.bridges_cache_path={BRIDGES_PATH}",
+                "skeleton.gap_width_check_db=20",
+            ],
+        )
+        # 3 branches with 50m gaps: a bridge crosses the first gap, none crosses the second one
+        masks = [box(0, 0, 25, 20), box(75, 0, 125, 20), box(175, 20, 200, 40)]
+        gdf_masks = gpd.GeoDataFrame(geometry=masks, crs=CRS)
+        branches_list = create_branches_list(config, gdf_masks, CRS)
+
+        candidates = [
+            Candidate(None, None, (25, 10), (75, 10), 2500),
+            Candidate(None, None, (125, 30), (175, 30), 2500),
+        ]
+        assert check_bridges_across_gaps(config, candidates) == [True, False]
+
+        validated_candidates = select_candidates(config, create_branches_pair(config, branches_list))
+        assert len(validated_candidates) == 1
+        assert {validated_candidates[0].branch_1.branch_id, validated_candidates[0].branch_2.branch_id} == {0, 1}
+
+
+def test_select_candidates_checks_in_one_batch(monkeypatch):
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(
+            config_name="configs_lidro.yaml",
+            overrides=[
+                "skeleton.db_uni.db_using_db=True",
+                f"skeleton.db_uni.bridges_cache_path={BRIDGES_PATH}",
+                "skeleton.gap_width_check_db=20",
+            ],
+        )
+        # 4 branches with 50m gaps: a bridge crosses the first gap only
+        masks = [box(0, 0, 25, 20), box(75, 0, 125, 20), box(175, 20, 200, 40), box(175, -60, 200, -40)]
+        branches_list = create_branches_list(config, gpd.GeoDataFrame(geometry=masks, crs=CRS), CRS)
+        branches_pair_list = create_branches_pair(config, branches_list)
+        assert len(branches_pair_list) > 2
+
+        checked_candidates_list = []
+        check = BridgesChecker.check
+
+        def spy_check(bridges_checker, candidates):
+            checked_candidates_list.append(candidates)
+            return check(bridges_checker, candidates)
+
+        monkeypatch.setattr(BridgesChecker, "check", spy_check)
+        validated_candidates = select_candidates(config, branches_pair_list)
+
+        # the candidates of all the pairs are checked at once
+        assert len(checked_candidates_list) == 1
+        checked_pairs = {
+            frozenset((candidate.branch_1.branch_id, candidate.branch_2.branch_id))
+            for candidate in checked_candidates_list[0]
+        }
+        assert len(checked_pairs) == len(branches_pair_list)
+        assert len(validated_candidates) == 1
+        assert {validated_candidates[0].branch_1.branch_id, validated_candidates[0].branch_2.branch_id} == {0, 1}
+
+
+def test_check_bridges_across_gaps_missing_cache():
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(
+            config_name="configs_lidro.yaml",
+            overrides=[f"skeleton.db_uni.bridges_cache_path={TMP_PATH / 'missing.fgb'}"],
+        )
+        with pytest.raises(FileNotFoundError):
+            check_bridges_across_gaps(config, [Candidate(None, None, (25, 10), (75, 10), 2500)])
+
+
+# do that test only if we can connect to BD UNI
+@pytest.mark.bduni
+def test_export_bridges():
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(
+            config_name="configs_lidro.yaml",
+            overrides=[
+                f"skeleton.db_uni.db_user={DB_UNI_USER}",
+                f'skeleton.db_uni.db_password="{DB_UNI_PASSWORD}"',
+            ],
+        )
+        output_path = TMP_PATH / "bridges_export.fgb"
+        with db_connector(config) as db_conn:
+            export_bridges((689000, 6760400, 689600, 6760800), output_path, CRS, db_conn)
+
+        assert read_bridges_bbox(output_path) == (689000, 6760400, 689600, 6760800)
+        bridges_tree = read_bridges(output_path)
+        # same candidate as in test_query_db_for_bridge_across_gap (it crosses a bridge)
+        assert query_bridges_across_lines(["LINESTRING(689291.25 6760579.75, 689303.75 6760569.25)"], bridges_tree)[0]
@@ -10,3 +10,17 @@ def test_group_maker():
     group_maker.put_together(A, B)
     assert group_maker.are_together(A, B)
     assert not group_maker.are_together(A, C)
+
+
+def test_group_maker_many_groups():
+    element_list = list(range(1000))
+    group_maker = GroupMaker(element_list)
+    # put together elements with the same remainder of the division by 10, in a long chain
+    for element in element_list[10:]:
+        group_maker.put_together(element, element - 10)
+    group_maker.put_together(3, 7)
+
+    for element_a, element_b in [(0, 990), (5, 15), (3, 997), (13, 7)]:
+        assert group_maker.are_together(element_a, element_b)
+    for element_a, element_b in [(0, 1), (5, 994), (3, 4)]:
+        assert not group_maker.are_together(element_a, element_b)
@@ -6,12 +6,17 @@ import pandas as pd
 import pytest
 from dotenv import load_dotenv
 from hydra import compose, initialize
+from shapely.geometry import box
 
 from lidro.skeleton.branch import Candidate
 from lidro.skeleton.create_skeleton_lines import (
     create_branches_list,
     create_branches_pair,
+    create_branches_skeleton,
+    db_connector,
+    get_reduced_gap_line,
     query_db_for_bridge_across_gap,
+    query_db_for_bridges_across_gaps,
     select_candidates,
 )
 
@@ -50,6 +55,44 @@ def test_main_skeleton_1():
         assert candidate_2.squared_distance < 75
 
 
+def test_create_branches_pair():
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(config_name="configs_lidro.yaml", overrides=["skeleton.max_gap_width=10"])
+        # A and B are 5m apart, B and C 10m apart (not strictly closer than max_gap_width), D is far away,
+        # A and E 9.99m apart
+        masks = [
+            box(0, 0, 10, 10),
+            box(15, 0, 25, 10),
+            box(35, 0, 45, 10),
+            box(1000, 0, 1010, 10),
+            box(0, 19.99, 10, 30),
+        ]
+        gdf_masks = gpd.GeoDataFrame(geometry=masks, crs=CRS)
+        branches_list = create_branches_list(config, gdf_masks, CRS)
+
+        branches_pair_list = create_branches_pair(config, branches_list)
+
+        assert [(pair[0].branch_id, pair[1].branch_id) for pair in branches_pair_list] == [(0, 1), (0, 4)]
+        assert branches_pair_list[0][2] == pytest.approx(5)
+        assert branches_pair_list[1][2] == pytest.approx(9.99)
+
+
+def test_create_branches_skeleton_parallel():
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(config_name="configs_lidro.yaml", overrides=["skeleton.branch.water_min_size=5"])
+        masks = [box(0, 0, 100, 10), box(0, 20, 10, 80), box(50, 50, 90, 60)]
+        gdf_masks = gpd.GeoDataFrame(geometry=masks, crs=CRS)
+
+        branches_serial = create_branches_list(config, gdf_masks, CRS)
+        create_branches_skeleton(branches_serial, num_workers=1)
+        branches_parallel = create_branches_list(config, gdf_masks, CRS)
+        create_branches_skeleton(branches_parallel, num_workers=2)
+
+        for branch_serial, branch_parallel in zip(branches_serial, branches_parallel):
+            assert len(branch_parallel.gdf_skeleton_lines) > 0
+            assert branch_parallel.gdf_skeleton_lines.geom_equals_exact(branch_serial.gdf_skeleton_lines, 0).all()
+
+
 # do that test only if we can connect to BD UNI
 @pytest.mark.bduni
 def test_query_db_for_bridge_across_gap():
@@ -69,3 +112,29 @@ def test_query_db_for_bridge_across_gap():
         is_bridge_2 = query_db_for_bridge_across_gap(config, dummy_candidate_2)
         assert not is_bridge_1
         assert is_bridge_2
+
+
+def test_get_reduced_gap_line():
+    candidate = Candidate(None, None, (0, 0), (100, 0), 10000)
+    assert get_reduced_gap_line(candidate, 0.25) == "LINESTRING(37.5 0.0, 62.5 0.0)"
+
+
+# do that test only if we can connect to BD UNI
+@pytest.mark.bduni
+def test_query_db_for_bridges_across_gaps():
+    """Test : query_db_for_bridges_across_gaps (both candidates in a single query)"""
+    with initialize(version_base="1.2", config_path="../../configs"):
+        config = compose(
+            config_name="configs_lidro.yaml",
+            overrides=[
+                f"skeleton.db_uni.db_user={DB_UNI_USER}",
+                f'skeleton.db_uni.db_password="{DB_UNI_PASSWORD}"',
+            ],
+        )
+        dummy_candidate_1 = Candidate(None, None, (687575.5, 6748540.586179815), (687594.5, 6748515.586065615), 0)
+        dummy_candidate_2 = Candidate(None, None, (689272.5, 6760595.5), (689322.5, 6760553.5), 0)
+
+        with db_connector(config) as db_conn:
+            is_bridge_list = query_db_for_bridges_across_gaps(config, [dummy_candidate_1, dummy_candidate_2], db_conn)
+            assert is_bridge_list == [False, True]
+            assert query_db_for_bridges_across_gaps(config, [], db_conn) == []
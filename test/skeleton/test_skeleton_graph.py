@@ -0,0 +1,94 @@
+import numpy as np
+import shapely
+from shapely import LineString, Point
+
+from lidro.skeleton.skeleton_graph import SkeletonGraph
+
+WATER_MIN_SIZE = 20
+
+
+def get_lines_set(skeleton_graph: SkeletonGraph) -> set:
+    return set(shapely.to_wkt(shapely.normalize(skeleton_graph.get_lines())))
+
+
+def test_skeleton_graph_nodes():
+    lines = [LineString([(0, 0), (10, 0)]), LineString([(10, 0), (20, 0)]), LineString([(10, 0), (10, 5)])]
+    skeleton_graph = SkeletonGraph(lines)
+
+    assert skeleton_graph.nb_edges == 3
+    assert len(skeleton_graph.node_coords) == 4
+    indptr, edges = skeleton_graph.get_adjacency(np.ones(3, dtype=bool))
+    degrees = np.diff(indptr)
+    center = np.flatnonzero((skeleton_graph.node_coords == (10, 0)).all(axis=1))[0]
+    assert degrees[center] == 3
+    start, end = indptr[center], indptr[center + 1]
+    assert list(edges[start:end]) == [0, 1, 2]
+    assert skeleton_graph.edge_lengths.tolist() == [10, 10, 5]
+
+
+def test_merge_edges():
+    # a line cut in 3 parts, a cross, and an isolated loop cut in 2 parts
+    lines = [
+        LineString([(0, 0), (10, 0)]),
+        LineString([(20, 0), (10, 0)]),
+        LineString([(20, 0), (30, 0)]),
+        LineString([(30, 0), (30, 10)]),
+        LineString([(30, 0), (30, -10)]),
+        LineString([(100, 0), (110, 0), (110, 10)]),
+        LineString([(110, 10), (100, 10), (100, 0)]),
+    ]
+    skeleton_graph = SkeletonGraph(lines)
+    skeleton_graph.merge_edges()
+
+    assert skeleton_graph.nb_edges == 4
+    assert sorted(skeleton_graph.edge_lengths.tolist()) == [10, 10, 30, 40]
+    merged_lines = skeleton_graph.get_lines()
+    assert shapely.equals(shapely.union_all(merged_lines), shapely.union_all(lines))  # the same lines, with less parts
+    loop = merged_lines[np.argmax(skeleton_graph.edge_lengths)]
+    assert loop.is_ring
+
+
+def test_simplify():
+    # a long river (2 lines of 100m) with a short spike in its middle, and 2 short spikes at one end
+    lines = [
+        LineString([(0, 0), (100, 0)]),
+        LineString([(100, 0), (200, 0)]),
+        LineString([(100, 0), (100, 5)]),
+        LineString([(200, 0), (210, 1)]),
+        LineString([(200, 0), (205, 10)]),
+    ]
+    skeleton_graph = SkeletonGraph(lines)
+    skeleton_graph.simplify(WATER_MIN_SIZE, [])
+
+    # the spike in the middle is removed, the straightest spike at the end continues the river
+    assert get_lines_set(skeleton_graph) == get_lines_set(
+        SkeletonGraph([LineString([(0, 0), (100, 0), (200, 0), (210, 1)])])
+    )
+
+
+def test_simplify_keeps_gap_points():
+    lines = [
+        LineString([(0, 0), (100, 0)]),
+        LineString([(100, 0), (200, 0)]),
+        LineString([(100, 0), (100, 5)]),
+    ]
+    skeleton_graph = SkeletonGraph(lines)
+    skeleton_graph.simplify(WATER_MIN_SIZE, [Point(100, 5)])
+
+    # the spike toward a point used to close a gap is kept
+    assert skeleton_graph.nb_edges == 3
+    assert get_lines_set(skeleton_graph) == get_lines_set(SkeletonGraph(lines))
+
+
+def test_simplify_isolated_lines():
+    # 3 short lines together, isolated: only the longest is kept, with the straightest one
+    lines = [
+        LineString([(0, 0), (10, 0)]),
+        LineString([(0, 0), (-5, 0)]),
+        LineString([(0, 0), (0, 3)]),
+    ]
+    skeleton_graph = SkeletonGraph(lines)
+    skeleton_graph.simplify(WATER_MIN_SIZE, [])
+
+    assert skeleton_graph.nb_edges == 1
+    assert skeleton_graph.get_lines()[0].length == 15
@@ -3,6 +3,7 @@ import shutil
 import subprocess as sp
 from pathlib import Path
 
+import geopandas as gpd
 import pytest
 from hydra import compose, initialize
 
@@ -132,3 +133,32 @@ def test_main_lidro_fail_no_output_dir():
         )
     with pytest.raises(ValueError):
         main(cfg)
+
+
+def test_main_lidro_mosaic():
+    input_dir = INPUT_DIR
+    output_dir = OUTPUT_DIR / "main_lidro_mosaic"
+    output_dir_by_tile = OUTPUT_DIR / "main_lidro_mosaic_by_tile"
+    for mosaic, output in [(True, output_dir), (False, output_dir_by_tile)]:
+        with initialize(version_base="1.2", config_path="../configs"):
+            cfg = compose(
+                config_name="configs_lidro",
+                overrides=[
+                    f"io.input_dir={input_dir}",
+                    f"io.output_dir={output}",
+                    "io.pixel_size=1",
+                    "io.tile_size=1000",
+                    "io.srid=2154",
+                    "io.num_workers=2",
+                    f"mask_generation.raster.mosaic={mosaic}",
+                ],
+            )
+        main(cfg)
+
+    # a single mask for all the tiles (and no temporary mosaic left)
+    assert sorted(os.listdir(output_dir)) == ["MaskHydro_mosaic.GeoJSON"]
+    gdf_mosaic = gpd.read_file(output_dir / "MaskHydro_mosaic.GeoJSON")
+    gdf_tile = gpd.read_file(output_dir_by_tile / "MaskHydro_Semis_2021_0830_6291_LA93_IGN69.GeoJSON")
+    # with a single tile, the mosaic is the mask of the tile
+    assert len(gdf_mosaic) == len(gdf_tile) > 0
+    assert gdf_mosaic.unary_union.symmetric_difference(gdf_tile.unary_union).area == 0
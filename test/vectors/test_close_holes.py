@@ -1,9 +1,9 @@
 import geopandas as gpd
 import pytest
 from shapely import get_num_interior_rings
-from shapely.geometry import Polygon
+from shapely.geometry import LineString, MultiPolygon, Polygon, box
 
-from lidro.vectors.close_holes import close_holes
+from lidro.vectors.close_holes import close_holes, close_holes_geoseries
 
 input = "./data/tile_0830_6291/mask_hydro_merge/MaskHydro_merge.geojson"
 
@@ -22,3 +22,47 @@ def test_close_holes_default(min_area, expected_nb_interiors):
 
     assert isinstance(mask_without_hole, Polygon)
     assert get_num_interior_rings(mask_without_hole) == expected_nb_interiors
+
+
+@pytest.mark.parametrize("min_area, expected_nb_interiors", [(None, [0, 0, 0]), (0, [2, 0, 1]), (50, [1, 0, 0])])
+def test_close_holes_geoseries(min_area, expected_nb_interiors):
+    polygons = gpd.GeoSeries(
+        [
+            box(0, 0, 100, 100).difference(box(10, 10, 15, 15)).difference(box(50, 50, 60, 60)),
+            box(200, 0, 210, 10),
+            box(300, 0, 400, 100).difference(box(310, 10, 315, 15)),
+        ],
+        index=[3, 5, 7],
+        crs="EPSG:2154",
+    )
+
+    result = close_holes_geoseries(polygons, min_area)
+
+    assert list(result.index) == [3, 5, 7]
+    assert result.crs == polygons.crs
+    assert [get_num_interior_rings(polygon) for polygon in result] == expected_nb_interiors
+    expected = polygons.apply(lambda p: close_holes(p, min_area))
+    assert result.geom_equals_exact(expected, 0).all()
+
+
+def test_close_holes_geoseries_not_polygons():
+    geometries = gpd.GeoSeries([LineString([(0, 0), (1, 1)]), Polygon(), box(0, 0, 1, 1)])
+
+    result = close_holes_geoseries(geometries, 10)
+
+    assert result.geom_equals_exact(geometries, 0).all()
+
+
+def test_close_holes_geoseries_multipolygons():
+    big = box(0, 0, 100, 100).difference(box(10, 10, 20, 20))
+    small = box(200, 0, 210, 10).difference(box(202, 2, 203, 3))
+    geometries = gpd.GeoSeries([MultiPolygon([big, small]), small, MultiPolygon()], index=[4, 2, 9])
+
+    result = close_holes_geoseries(geometries, 50)
+
+    assert list(result.index) == [4, 2, 9]
+    assert isinstance(result[4], MultiPolygon)
+    assert [get_num_interior_rings(polygon) for polygon in result[4].geoms] == [1, 0]
+    assert result[4].geoms[0].equals(big)
+    assert get_num_interior_rings(result[2]) == 0
+    assert result[9].is_empty